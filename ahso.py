@@ -1,15 +1,30 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify
 from flask_cors import CORS
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import MinMaxScaler
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import LSTM, Dense
-from pyswarm import pso
-import random
-import tempfile
 import os
+import re
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+import uuid
+import multiprocessing
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import warnings
+from streaming import STREAM_FORMATS, stream_rows
+from table_io import read_upload, request_fields, result_format, write_table
+from metrics import Metrics, instrument
+from delay_model import intersection_delay, timings_from_columns
+from ingest import hourly, read_hourly_csv
+from corridor import CYCLE_RANGE as CORRIDOR_CYCLES, CYCLE_STEP as CORRIDOR_STEP, optimize_corridor
 
 warnings.filterwarnings("ignore")
 
@@ -19,10 +34,89 @@ CORS(app)
 # Constants
 YELLOW_TIME = 4
 
+# Particle swarm defaults; the swarm is seeded from the GA elite, so it needs
+# far fewer iterations than a cold start
+PSO_SWARMSIZE = 40
+PSO_MAXITER = 30
+PSO_INERTIA = 0.5
+
+# Stall-based early stopping: the GA and PSO stages each end once their best
+# score has not improved by more than STALL_TOL for STALL_PATIENCE
+# generations/iterations (0 disables it)
+STALL_TOL = float(os.environ.get('AHSO_STALL_TOL', 1e-6))
+STALL_PATIENCE = int(os.environ.get('AHSO_STALL_PATIENCE', 10))
+
+# 'exact' solves the fairness objective in closed form across all rows;
+# 'hybrid' is the GA+PSO metaheuristic, kept for non-convex objectives
+SOLVERS = ('hybrid', 'exact')
+
+# Hybrid search objectives: 'fairness' matches green shares to demand shares;
+# 'delay' minimises the modeled average control delay (see delay_model)
+OBJECTIVES = ('fairness', 'delay')
+
+# 'recursive' feeds each one-step LSTM forecast back in 168 times; 'direct'
+# trains a multi-output head and forecasts the week in one or two passes
+FORECAST_MODES = ('recursive', 'direct')
+DIRECT_MIN_SAMPLES = 24
+
+# /predict backends: the LSTM, or one of the NumPy weekly-seasonal models
+FORECAST_MODELS = ('lstm', 'seasonal_naive', 'holt_winters', 'profile')
+SEASON = 168
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Uploads carrying these columns hold many intersections and are optimized
+# with optimize_batch instead of a single intersection_type
+BATCH_COLUMNS = {'Intersection_ID', 'Intersection_Type'}
+
+# Optimized timings are whole seconds well under 2**15
+TIMING_DTYPE = np.int16
+
+# Process-pool size for optimize_dataset; 0 means one worker per core, and
+# requests never get more workers than there are cores
+OPTIMIZE_WORKERS = int(os.environ.get('AHSO_WORKERS', 1))
+
+# Row workers start from a forkserver rather than a fork of this process,
+# which runs request and job threads and may have TensorFlow loaded
+ROW_POOL_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+# Largest search settings a request may ask for
+MAX_SWARMSIZE = 500
+MAX_ITER = 1000
+
+# Stage timers and evaluation counters, served on GET /metrics
+METRICS = Metrics('ahso')
+
+# TensorFlow/Keras and scikit-learn are only needed by /predict, so they are
+# imported on first use (or by the optional warm-up thread) rather than at
+# startup
+_forecast_deps = None
+_forecast_deps_lock = threading.Lock()
+
+def forecasting_deps():
+    global _forecast_deps
+    if _forecast_deps is None:
+        with _forecast_deps_lock:
+            if _forecast_deps is None:
+                from sklearn.preprocessing import MinMaxScaler
+                from tensorflow.keras.models import Sequential, load_model
+                from tensorflow.keras.layers import LSTM, Dense
+                _forecast_deps = SimpleNamespace(
+                    MinMaxScaler=MinMaxScaler,
+                    Sequential=Sequential,
+                    load_model=load_model,
+                    LSTM=LSTM,
+                    Dense=Dense
+                )
+    return _forecast_deps
+
+def start_warmup():
+    thread = threading.Thread(target=forecasting_deps, name="forecast-warmup", daemon=True)
+    thread.start()
+    return thread
+
 def load_dataset(file_path):
-    df = pd.read_csv(file_path)
-    df.columns = [c.strip().replace(" ", "_") for c in df.columns]
-    return df
+    return read_hourly_csv(file_path)
 
 def get_signal_count(intersection_type):
     return {
@@ -42,22 +136,149 @@ def determine_cycle_length(total_vehicles):
     else:
         return 160
 
+def approach_counts(row, signal_count):
+    return np.array([row.get(f'Signal_{i+1}_Vehicles', 0) for i in range(signal_count)], dtype=float)
+
+def demand_ratios(row, signal_count):
+    # Like the exact solver, hours without usable counts get an even split
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = approach_counts(row, signal_count) / float(row['Total_Vehicles'])
+    if not np.isfinite(ratios).all():
+        return np.full(signal_count, 1 / signal_count)
+    return ratios
+
+def batch_objective(X, ratios, signal_count, cycle_length):
+    """Score every candidate in an (n_candidates, signal_count) array at once.
+
+    Candidates whose green times plus yellow clearances overrun the cycle are
+    masked to inf rather than rejected one by one.
+    """
+    X = np.atleast_2d(np.asarray(X, dtype=float))[:, :signal_count]
+    total_green = X.sum(axis=1)
+    feasible = total_green + (YELLOW_TIME * signal_count) <= cycle_length + 1e-9
+    with np.errstate(divide='ignore', invalid='ignore'):
+        green_ratio = X / total_green[:, None]
+    fairness_penalty = np.abs(ratios - green_ratio).sum(axis=1)
+    return np.where(feasible, fairness_penalty, np.inf)
+
+def delay_objective(X, flows, signal_count, cycle_length):
+    """Modeled average delay (s/veh) of every candidate, inf where the cycle overruns."""
+    X = np.atleast_2d(np.asarray(X, dtype=float))[:, :signal_count]
+    feasible = X.sum(axis=1) + (YELLOW_TIME * signal_count) <= cycle_length + 1e-9
+    delay, _ = intersection_delay(flows, X, cycle_length)
+    return np.where(feasible, delay, np.inf)
+
 def objective_function(x, row, signal_count, cycle_length):
-    total_green = sum(x[:signal_count])
-    if total_green + (YELLOW_TIME * signal_count) > cycle_length:
-        return float('inf')
-    fairness_penalty = 0
-    for i in range(signal_count):
-        expected_ratio = row.get(f'Signal_{i+1}_Vehicles', 0) / row['Total_Vehicles']
-        green_ratio = x[i] / total_green
-        fairness_penalty += abs(expected_ratio - green_ratio)
-    return fairness_penalty
-
-def hybrid_optimize_signal_timings(row, signal_count):
+    return batch_objective(x, demand_ratios(row, signal_count), signal_count, cycle_length)[0]
+
+def pso_optimize(func, lb, ub, init=None, swarmsize=PSO_SWARMSIZE, maxiter=PSO_MAXITER,
+                 omega=PSO_INERTIA, phip=0.5, phig=0.5, rng=None, report=None,
+                 tol=STALL_TOL, patience=STALL_PATIENCE, deadline=None, project=None):
+    """Minimise func over the box [lb, ub] with an array-based particle swarm.
+
+    func scores a whole (swarmsize, dims) array per call. Rows of init seed the
+    swarm; any particles left over start uniformly at random inside the bounds.
+    project, if given, maps a (swarmsize, dims) array of positions back into
+    the feasible region and is applied to the start positions and every move.
+    The swarm stops early after `patience` iterations without a gain of more
+    than `tol`, or once time.time() passes `deadline`, returning the best
+    position so far. If report is a dict, the iterations run and the stop
+    reason ('converged', 'deadline' or 'max_iter') are stored in it.
+    """
+    rng = np.random.default_rng() if rng is None else rng
+    lb = np.asarray(lb, dtype=float)
+    ub = np.asarray(ub, dtype=float)
+    span = ub - lb
+
+    x = lb + rng.random((swarmsize, lb.size)) * span
+    if init is not None:
+        seeds = np.clip(np.asarray(init, dtype=float), lb, ub)[:swarmsize]
+        x[:len(seeds)] = seeds
+    if project is not None:
+        x = project(x)
+    v = rng.uniform(-span, span, size=x.shape)
+
+    best_pos, best_fit = x.copy(), func(x)
+    g = np.argmin(best_fit)
+    swarm_pos, swarm_fit = best_pos[g].copy(), best_fit[g]
+
+    iterations, stalled, stop = 0, 0, 'max_iter'
+    for _ in range(maxiter):
+        if deadline is not None and time.time() >= deadline:
+            stop = 'deadline'
+            break
+        iterations += 1
+        rp = rng.random(x.shape)
+        rg = rng.random(x.shape)
+        v = omega * v + phip * rp * (best_pos - x) + phig * rg * (swarm_pos - x)
+        x = np.clip(x + v, lb, ub)
+        if project is not None:
+            x = project(x)
+        fx = func(x)
+
+        improved = fx < best_fit
+        best_pos[improved] = x[improved]
+        best_fit[improved] = fx[improved]
+
+        g = np.argmin(best_fit)
+        # Only count a stall once something feasible (finite) has been found
+        stalled = 0 if best_fit[g] < swarm_fit - tol or not np.isfinite(best_fit[g]) else stalled + 1
+        if best_fit[g] < swarm_fit:
+            swarm_pos, swarm_fit = best_pos[g].copy(), best_fit[g]
+        if patience and stalled >= patience:
+            stop = 'converged'
+            break
+
+    if report is not None:
+        report.update(pso_iterations=iterations, pso_stop=stop)
+    return swarm_pos, swarm_fit
+
+def sample_greens(rng, size, signal_count, cycle_length):
+    """Random whole-second greens that fit the cycle with at least 10 s each.
+
+    The green budget above the minimums is split by Dirichlet shares.
+    """
+    spare = cycle_length - YELLOW_TIME * signal_count - 10 * signal_count
+    shares = rng.dirichlet(np.ones(signal_count), size=size)
+    return 10 + np.floor(shares * spare).astype(int)
+
+def fit_to_cycle(X, signal_count, cycle_length):
+    """Project candidate greens onto {x >= 10, sum(x) + yellows <= cycle}."""
+    available = cycle_length - YELLOW_TIME * signal_count
+    X = np.maximum(X, 10)
+    over = X.sum(axis=1) > available
+    if over.any():
+        lower = np.full(over.sum(), 10 / available)
+        X[over] = project_shares(X[over] / available, lower) * available
+    return X
+
+def hybrid_optimize_signal_timings(row, signal_count, swarmsize=PSO_SWARMSIZE, maxiter=PSO_MAXITER,
+                                   inertia=PSO_INERTIA, rng=None, report=None, tol=STALL_TOL,
+                                   patience=STALL_PATIENCE, deadline=None, objective='fairness'):
+    """GA search followed by a PSO refinement seeded from the GA elite.
+
+    Both stages stop early on a stall (see pso_optimize). With a `deadline`
+    (a time.time() value) the search is anytime: whatever stage is running
+    when it passes hands back the best timings found so far. If report is a
+    dict, it is filled with the stage times, generations/iterations run, stop
+    reasons, candidate timings scored and the final objective value.
+    `objective` is one of OBJECTIVES.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective '{objective}', expected one of {', '.join(OBJECTIVES)}")
+    rng = np.random.default_rng() if rng is None else rng
+    report = {} if report is None else report
     cycle_length = determine_cycle_length(row['Total_Vehicles'])
+    if objective == 'delay':
+        score, demand = delay_objective, approach_counts(row, signal_count)
+    else:
+        score, demand = batch_objective, demand_ratios(row, signal_count)
+    evaluations = 0
 
-    def obj_wrapper(x):
-        return objective_function(x, row, signal_count, cycle_length)
+    def obj_wrapper(X):
+        nonlocal evaluations
+        evaluations += len(X)
+        return score(X, demand, signal_count, cycle_length)
 
     lb = [10] * signal_count
     ub = [cycle_length - YELLOW_TIME * signal_count] * signal_count
@@ -65,168 +286,1255 @@ def hybrid_optimize_signal_timings(row, signal_count):
     population_size = 30
     generations = 40
     mutation_rate = 0.5
+    half = population_size // 2
 
-    def mutate(individual):
-        idx = random.randint(0, signal_count - 1)
-        individual[idx] = random.randint(10, cycle_length - YELLOW_TIME)
-        return individual
-
-    population = [list(np.random.randint(10, cycle_length - YELLOW_TIME, size=signal_count)) for _ in range(population_size)]
+    # Candidates are drawn, mutated and moved inside the feasible region, so
+    # no evaluations are spent on plans that overrun the cycle
+    available = cycle_length - YELLOW_TIME * signal_count
+    start = time.perf_counter()
+    population = sample_greens(rng, population_size, signal_count, cycle_length)
 
+    ga_best, stalled, ga_stop, ga_generations = np.inf, 0, 'max_iter', 0
     for _ in range(generations):
-        fitness = [obj_wrapper(ind) for ind in population]
-        sorted_pop = [x for _, x in sorted(zip(fitness, population))]
-        top_half = sorted_pop[:population_size // 2]
-        offspring = []
-        for _ in range(population_size // 2):
-            parent = random.choice(top_half).copy()
-            if random.random() < mutation_rate:
-                parent = mutate(parent)
-            offspring.append(parent)
-        population = top_half + offspring
-
-    def pso_with_init():
-        xopt, _ = pso(obj_wrapper, lb, ub, swarmsize=40, maxiter=60, debug=False)
-        return xopt
-
-    xopt = pso_with_init()
-    green_times = [round(g) for g in xopt]
+        fitness = obj_wrapper(population)
+        ranked = np.argsort(fitness, kind='stable')[:half]
+        top_half, top_fitness = population[ranked], fitness[ranked]
+        ga_generations += 1
+
+        best = fitness.min()
+        stalled = 0 if best < ga_best - tol or not np.isfinite(best) else stalled + 1
+        ga_best = min(ga_best, best)
+        if patience and stalled >= patience:
+            ga_stop = 'converged'
+            break
+        if deadline is not None and time.time() >= deadline:
+            ga_stop = 'deadline'
+            break
+
+        # Offspring are copies of random elite parents, half of them with one
+        # signal re-drawn at random within the green the others leave over
+        offspring = top_half[rng.integers(0, half, size=half)]
+        mutants = np.flatnonzero(rng.random(half) < mutation_rate)
+        genes = rng.integers(0, signal_count, size=mutants.size)
+        slack = available - offspring[mutants].sum(axis=1) + offspring[mutants, genes]
+        offspring[mutants, genes] = rng.integers(10, slack + 1)
+
+        population = np.vstack([top_half, offspring])
+
+    ga_done = time.perf_counter()
+    report.update(ga_generations=ga_generations, ga_stop=ga_stop)
+
+    # Warm-start the swarm from the feasible part of the GA elite instead of
+    # a fresh random swarm
+    elite = top_half[np.isfinite(top_fitness)]
+    xopt, fopt = pso_optimize(obj_wrapper, lb, ub, init=elite if len(elite) else None,
+                              swarmsize=swarmsize, maxiter=maxiter, omega=inertia, rng=rng,
+                              report=report, tol=tol, patience=patience, deadline=deadline,
+                              project=lambda X: fit_to_cycle(X, signal_count, cycle_length))
+    report['ga_seconds'] = ga_done - start
+    report['pso_seconds'] = time.perf_counter() - ga_done
+    report['objective_evaluations'] = evaluations
+    report['best_fitness'] = float(fopt)
+    green_times = round_to_budget(np.asarray(xopt, dtype=float)[None, :], available)[0].tolist()
     red_times = [cycle_length - g - YELLOW_TIME for g in green_times]
     return green_times, red_times, cycle_length
 
-def optimize_dataset(df, intersection_type):
+def approach_count_matrix(df, signal_count):
+    return np.column_stack([
+        df[f'Signal_{j+1}_Vehicles'].to_numpy(dtype=float) if f'Signal_{j+1}_Vehicles' in df.columns
+        else np.zeros(len(df))
+        for j in range(signal_count)
+    ])
+
+def demand_ratio_matrix(df, signal_count):
+    totals = df['Total_Vehicles'].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = approach_count_matrix(df, signal_count) / totals[:, None]
+    return ratios
+
+def cycle_length_array(total_vehicles):
+    buckets = np.digitize(np.asarray(total_vehicles, dtype=float), [500, 1200, 2000], right=True)
+    return np.array([90, 120, 150, 160])[buckets]
+
+def project_shares(ratios, lower):
+    """Euclidean projection of each row onto {s : sum(s) = 1, s >= lower}.
+
+    Raising every under-served approach to its floor and taking the excess
+    uniformly from the rest is also what minimises the L1 fairness penalty.
+    """
+    n, k = ratios.shape
+    budget = 1 - k * lower
+    y = ratios - lower[:, None]
+    u = -np.sort(-y, axis=1)
+    css = np.cumsum(u, axis=1) - budget[:, None]
+    active = u - css / np.arange(1, k + 1) > 0
+    rho = k - 1 - np.argmax(active[:, ::-1], axis=1)
+    tau = css[np.arange(n), rho] / (rho + 1)
+    return lower[:, None] + np.maximum(y - tau[:, None], 0)
+
+def round_to_budget(green_exact, available):
+    """Round each row of greens to whole seconds without overrunning its budget.
+
+    Rows are floored, then the seconds lost to rounding (never more than
+    `available` leaves) go to the largest remainders.
+    """
+    green = np.floor(green_exact + 1e-9)
+    target = np.minimum(np.round(green_exact.sum(axis=1)), available)
+    spare = np.maximum(target - green.sum(axis=1), 0)
+    order = np.argsort(-(green_exact - green), axis=1, kind='stable')
+    rank = np.empty_like(order)
+    np.put_along_axis(rank, order, np.broadcast_to(np.arange(green.shape[1]), order.shape), axis=1)
+    return (green + (rank < spare[:, None])).astype(int)
+
+def exact_optimize_signal_timings(df, signal_count):
+    """Solve the fairness objective in closed form for every row at once.
+
+    The whole green budget of each cycle is split in proportion to the
+    vehicle shares, projected onto the min-green bound, then rounded to whole
+    seconds with a largest-remainder pass so the cycle never overruns.
+    """
+    cycle_length = cycle_length_array(df['Total_Vehicles'])
+    available = (cycle_length - YELLOW_TIME * signal_count).astype(float)
+
+    ratios = demand_ratio_matrix(df, signal_count)
+    unknown = ~np.isfinite(ratios).all(axis=1)
+    ratios[unknown] = 1 / signal_count
+
+    shares = project_shares(ratios, 10 / available)
+    green = round_to_budget(shares * available[:, None], available)
+
+    red = cycle_length[:, None] - green - YELLOW_TIME
+    return green, red, cycle_length
+
+class SignalPlanCache:
+    """In-process LRU cache of optimized plans keyed on quantized demand.
+
+    Rows that share an intersection type, a cycle length bucket and the same
+    approach shares (rounded to `step`) reuse one GA+PSO result. Objectives
+    that depend on absolute volumes also key on the approach counts.
+    """
+
+    def __init__(self, maxsize=4096, step=0.01):
+        self.maxsize = maxsize
+        self.step = step
+        self.hits = 0
+        self.misses = 0
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, intersection_type, cycle_length, ratios, options=None, flows=None):
+        options = tuple(sorted((options or {}).items()))
+        key = intersection_type, cycle_length, self._quantize(ratios, self.step), options
+        if flows is not None:
+            key += (self._quantize(flows, 1),)
+        return key
+
+    @staticmethod
+    def _quantize(values, step):
+        # Blank counts stay NaN through ingest; they key as None
+        return tuple(int(q) if np.isfinite(q) else None for q in np.round(np.asarray(values, dtype=float) / step))
+
+    def get(self, key):
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is None:
+                self.misses += 1
+                return None
+            self._plans.move_to_end(key)
+            self.hits += 1
+            return plan
+
+    def put(self, key, plan):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": len(self._plans),
+                "maxsize": self.maxsize,
+                "step": self.step,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+PLAN_CACHE = SignalPlanCache(
+    maxsize=int(os.environ.get('AHSO_CACHE_SIZE', 4096)),
+    step=float(os.environ.get('AHSO_CACHE_STEP', 0.01))
+)
+
+class ResultStore:
+    """SQLite store of hybrid plans keyed by intersection, Day, Hour and row inputs,
+    plus whole results keyed by upload, so re-uploads only search changed rows."""
+
+    def __init__(self, path, max_age=90 * 24 * 3600, max_files=32):
+        self.path = path
+        self.max_age = max_age
+        self.max_files = max_files
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if not self._ready:
+            with self._lock:
+                if not self._ready:
+                    os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                    db = sqlite3.connect(self.path, timeout=30)
+                    with db:
+                        db.execute("PRAGMA journal_mode=WAL")
+                        db.execute("CREATE TABLE IF NOT EXISTS plans (intersection TEXT, settings TEXT, "
+                                   "day TEXT, hour INTEGER, row_hash INTEGER, plan TEXT, used_at REAL, "
+                                   "PRIMARY KEY (intersection, settings, day, hour, row_hash))")
+                        db.execute("CREATE TABLE IF NOT EXISTS files "
+                                   "(file_hash TEXT PRIMARY KEY, result BLOB, used_at REAL)")
+                    db.close()
+                    self._ready = True
+        return sqlite3.connect(self.path, timeout=30)
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per call, so request and job threads
+        # never share one; each call is a single transaction
+        db = self._open()
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    @staticmethod
+    def settings_hash(intersection_type, solver, options):
+        payload = json.dumps([intersection_type, solver, sorted(options.items())], default=str)
+        return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+    @staticmethod
+    def file_hash(df, intersection_id, settings):
+        digest = hashlib.sha1(json.dumps([list(map(str, df.columns)), str(intersection_id), settings]).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def row_keys(df, intersection_id, signal_count):
+        """(intersection, day, hour, input hash) for every row, computed column-wise."""
+        inputs = [c for c in ['Total_Vehicles'] + [f'Signal_{j+1}_Vehicles' for j in range(signal_count)]
+                  if c in df.columns]
+        hashes = pd.util.hash_pandas_object(df[inputs].astype(float), index=False).to_numpy().view(np.int64)
+        if 'Intersection_ID' in df.columns:
+            ids = df['Intersection_ID'].astype(str).tolist()
+        else:
+            ids = [str(intersection_id or '')] * len(df)
+        days = df['Day'].astype(str).tolist() if 'Day' in df.columns else [''] * len(df)
+        hours = df['Hour'].astype(int).tolist() if 'Hour' in df.columns else [-1] * len(df)
+        return list(zip(ids, days, hours, hashes.tolist()))
+
+    def get_file(self, file_hash):
+        with self._connect() as db:
+            found = db.execute("SELECT result FROM files WHERE file_hash = ?", (file_hash,)).fetchone()
+            if found is None:
+                return None
+            db.execute("UPDATE files SET used_at = ? WHERE file_hash = ?", (time.time(), file_hash))
+        return pickle.loads(found[0])
+
+    def put_file(self, file_hash, result):
+        with self._connect() as db:
+            db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)",
+                       (file_hash, pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), time.time()))
+            db.execute("DELETE FROM files WHERE file_hash NOT IN "
+                       "(SELECT file_hash FROM files ORDER BY used_at DESC LIMIT ?)", (self.max_files,))
+
+    def get_plans(self, keys, settings):
+        """Stored plan (green, red, cycle) for each key, or None where there is none."""
+        found = {}
+        with self._connect() as db:
+            for intersection in set(k[0] for k in keys):
+                rows = db.execute("SELECT day, hour, row_hash, plan FROM plans "
+                                  "WHERE intersection = ? AND settings = ?", (intersection, settings))
+                found.update(((intersection, day, hour, row_hash), plan) for day, hour, row_hash, plan in rows)
+            hits = [key for key in set(keys) if key in found]
+            db.executemany("UPDATE plans SET used_at = ? WHERE intersection = ? AND settings = ? "
+                           "AND day = ? AND hour = ? AND row_hash = ?",
+                           [(time.time(), k[0], settings, k[1], k[2], k[3]) for k in hits])
+        return [tuple(json.loads(found[key])) if key in found else None for key in keys]
+
+    def put_plans(self, keys, settings, plans):
+        now = time.time()
+        with self._connect() as db:
+            db.executemany("INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?, ?, ?, ?)", [
+                (intersection, settings, day, hour, row_hash,
+                 json.dumps([np.asarray(green).tolist(), np.asarray(red).tolist(), int(cycle)]), now)
+                for (intersection, day, hour, row_hash), (green, red, cycle) in zip(keys, plans)
+            ])
+            db.execute("DELETE FROM plans WHERE used_at < ?", (now - self.max_age,))
+
+    def clear(self):
+        with self._connect() as db:
+            db.execute("DELETE FROM plans")
+            db.execute("DELETE FROM files")
+
+_result_store_path = os.environ.get(
+    'AHSO_RESULT_STORE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'store', 'results.sqlite3'))
+RESULT_STORE = ResultStore(
+    _result_store_path,
+    max_age=float(os.environ.get('AHSO_RESULT_STORE_MAX_AGE_DAYS', 90)) * 24 * 3600,
+    max_files=int(os.environ.get('AHSO_RESULT_STORE_MAX_FILES', 32))
+) if _result_store_path else None
+
+def _seed_sequence(seed):
+    return seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+_row_pools = {}
+_row_pools_lock = threading.Lock()
+
+def row_pool(workers):
+    """Long-lived process pool with `workers` row optimizers, shared by all requests."""
+    with _row_pools_lock:
+        pool = _row_pools.get(workers)
+        if pool is None:
+            pool = _row_pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=ROW_POOL_CONTEXT)
+        return pool
+
+def _discard_row_pool(workers, pool):
+    # A pool whose worker died stays broken; the next request starts a new one
+    with _row_pools_lock:
+        if _row_pools.get(workers) is pool:
+            del _row_pools[workers]
+
+def _optimize_row(task):
+    row, signal_count, seed, deadline, pso_options = task
+    report = {}
+    plan = hybrid_optimize_signal_timings(row, signal_count, rng=np.random.default_rng(seed),
+                                          report=report, deadline=deadline, **pso_options)
+    return plan, report
+
+def _record_search(report):
+    # Reports come back from the worker processes with the plans, so stage
+    # timings are recorded here whatever the worker count
+    METRICS.observe('stage_seconds', report['ga_seconds'], stage='ga')
+    METRICS.observe('stage_seconds', report['pso_seconds'], stage='pso')
+    METRICS.inc('objective_evaluations', report['objective_evaluations'])
+    METRICS.inc('ga_generations', report['ga_generations'])
+    METRICS.inc('pso_iterations', report['pso_iterations'])
+    METRICS.inc('rows_searched')
+    METRICS.inc('search_stops', stage='ga', reason=report['ga_stop'])
+    METRICS.inc('search_stops', stage='pso', reason=report['pso_stop'])
+
+def _add_to_convergence(convergence, report):
+    convergence['rows_searched'] = convergence.get('rows_searched', 0) + 1
+    for key in ('ga_generations', 'pso_iterations', 'objective_evaluations'):
+        convergence[key] = convergence.get(key, 0) + report[key]
+    for stage in ('ga', 'pso'):
+        stops = convergence.setdefault(f'{stage}_stops', {})
+        stops[report[f'{stage}_stop']] = stops.get(report[f'{stage}_stop'], 0) + 1
+    if not np.isfinite(report['best_fitness']):
+        convergence['infeasible_rows'] = convergence.get('infeasible_rows', 0) + 1
+
+def iter_plans(df, intersection_type, workers=1, seed=None, cache=None, progress=None,
+               time_budget=None, report=None, **pso_options):
+    """Yield the hybrid plan of every row in row order; seeds are per row, so results
+    don't depend on `workers`, and `time_budget` (s) is shared out across each worker's rows."""
+    started = time.time()
     signal_count = get_signal_count(intersection_type)
-    optimized = df.copy()
+    columns = ['Total_Vehicles'] + [f'Signal_{j+1}_Vehicles' for j in range(signal_count)]
+    records = df[[c for c in columns if c in df.columns]].to_dict('records')
+    row_seeds = _seed_sequence(seed).spawn(len(records))
 
-    for i, row in df.iterrows():
-        green, red, cycle = hybrid_optimize_signal_timings(row, signal_count)
-        for j in range(signal_count):
-            optimized.at[i, f'Signal_{j+1}_Green'] = green[j]
-            optimized.at[i, f'Signal_{j+1}_Red'] = red[j]
+    results = [None] * len(records)
+    pending = {}
+    for i, row in enumerate(records):
+        if cache is None:
+            pending[i] = [i]
+            continue
+        # The delay objective scores absolute flows, not just their shares
+        flows = approach_counts(row, signal_count) if pso_options.get('objective') == 'delay' else None
+        key = cache.key(intersection_type, determine_cycle_length(row['Total_Vehicles']),
+                        demand_ratios(row, signal_count), pso_options, flows=flows)
+        if key in pending:
+            pending[key].append(i)
+            continue
+        plan = cache.get(key)
+        if plan is None:
+            pending[key] = [i]
+        else:
+            results[i] = plan
+
+    workers = min(workers or os.cpu_count(), os.cpu_count(), max(len(pending), 1))
+    parallel = workers > 1 and len(pending) > 1
+    deadlines = [None] * len(pending)
+    if time_budget is not None:
+        lanes = workers if parallel else 1
+        slots = -(-len(pending) // lanes)
+        deadlines = [started + time_budget * (t // lanes + 1) / slots for t in range(len(pending))]
+    tasks = [(records[rows[0]], signal_count, row_seeds[rows[0]], deadline, pso_options)
+             for rows, deadline in zip(pending.values(), deadlines)]
+
+    done = sum(result is not None for result in results)
+    if report is not None:
+        report['rows'] = report.get('rows', 0) + len(records)
+        report['rows_from_cache'] = report.get('rows_from_cache', 0) + len(records) - sum(map(len, pending.values()))
+    if progress is not None:
+        progress(done, len(records))
+
+    next_row = 0
+    if parallel:
+        # Hand rows out one at a time under a budget so each worker's
+        # k-th row lines up with its deadline slot
+        executor = row_pool(workers)
+        chunksize = 1 if time_budget is not None else max(1, len(tasks) // (workers * 4))
+        plans = executor.map(_optimize_row, tasks, chunksize=chunksize)
+    else:
+        plans = map(_optimize_row, tasks)
+
+    try:
+        for (key, rows), (plan, row_report) in zip(pending.items(), plans):
+            _record_search(row_report)
+            if report is not None:
+                _add_to_convergence(report, row_report)
+            if cache is not None and 'deadline' not in (row_report['ga_stop'], row_report['pso_stop']):
+                cache.put(key, plan)
+            for i in rows:
+                results[i] = plan
+            done += len(rows)
+            if progress is not None:
+                progress(done, len(records))
+
+            while next_row < len(results) and results[next_row] is not None:
+                yield results[next_row]
+                next_row += 1
+    except BrokenProcessPool:
+        _discard_row_pool(workers, executor)
+        raise
+
+    if report is not None:
+        report['elapsed_s'] = round(report.get('elapsed_s', 0) + time.time() - started, 3)
+    yield from results[next_row:]
+
+def _check_solver(solver, pso_options):
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown solver '{solver}', expected one of {', '.join(SOLVERS)}")
+    objective = pso_options.get('objective', 'fairness')
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective '{objective}', expected one of {', '.join(OBJECTIVES)}")
+    if solver == 'exact' and objective != 'fairness':
+        raise ValueError("The exact solver only supports the fairness objective")
+
+def _metric_column(df, column):
+    if column not in df.columns:
+        return np.zeros(len(df))
+    return df[column].to_numpy(dtype=float)
+
+def metric_baseline(df, signal_count):
+    """Approach flows and the modeled delay and queue of the upload's current plans.
+
+    The current plans come from the Signal_i_Timings columns; without them,
+    or without observed averages to scale, the modeled baseline is None.
+    Current greens that overrun their cycle together are read as splits and
+    scaled down to fit it, like the optimized plans.
+    """
+    flows = approach_count_matrix(df, signal_count)
+    current = timings_from_columns(df, signal_count)
+    if current is None or not {'Avg_Queue_Length', 'Avg_Delay_Time'} <= set(df.columns):
+        return flows, None, None
+    green, cycle = current
+    cycle = cycle.max(axis=1)
+    current_delay, current_queue = intersection_delay(flows, scale_to_cycle(green, cycle), cycle[:, None])
+    return flows, current_queue, current_delay
+
+def scale_to_cycle(green, cycle):
+    """Greens of plans that overrun their cycle (with yellows), scaled down to fit it."""
+    green = np.asarray(green, dtype=float)
+    cycle = np.asarray(cycle, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fit = np.minimum(1, (cycle - YELLOW_TIME * green.shape[1]) / green.sum(axis=1))
+    return green * np.where(np.isfinite(fit), fit, 1)[:, None]
+
+def modeled_metrics(flows, green, cycle, original_queue, original_delay, current_queue=None,
+                    current_delay=None):
+    """Average queue (veh) and delay (s/veh) under the optimized plans.
+
+    With a modeled baseline for the current plans, the observed averages are
+    scaled by the modeled change, so the reported figures stay calibrated
+    to the upload; otherwise the modeled values are reported as they are.
+    Plans that overrun their cycle are scored as scaled down to fit it, like
+    the current plans, so they never look better than a plan that can run.
+    """
+    cycle = np.asarray(cycle, dtype=float)
+    delay, queue = intersection_delay(flows, scale_to_cycle(green, cycle), cycle[:, None])
+    if current_delay is not None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            queue_change = queue / current_queue
+            delay_change = delay / current_delay
+        queue = np.where(np.isfinite(queue_change), original_queue * queue_change, queue)
+        delay = np.where(np.isfinite(delay_change), original_delay * delay_change, delay)
+    return np.round(queue, 2), np.round(delay, 2)
 
-        optimized.at[i, 'Cycle_Length'] = cycle
+def _exact_report(report, rows):
+    # The closed form always converges, so only the row count is reported
+    if report is not None:
+        report['rows'] = report.get('rows', 0) + rows
+
+def _store_report(report, rows):
+    if report is not None and rows:
+        report['rows'] = report.get('rows', 0) + rows
+        report['rows_from_store'] = report.get('rows_from_store', 0) + rows
+
+def solver_blocks(df, intersection_type, solver, workers, seed, cache, progress, time_budget, report,
+                  pso_options):
+    """Plans for the rows of df in row order, as (green, red, cycle) array blocks.
+
+    The exact solver gives one block for all rows, the hybrid search one
+    block per row as it finishes.
+    """
+    _check_solver(solver, pso_options)
+    METRICS.inc('rows_optimized', len(df), solver=solver)
+    if solver == 'exact':
+        with METRICS.timer('exact_solve'):
+            plans = exact_optimize_signal_timings(df, get_signal_count(intersection_type))
+        _exact_report(report, len(df))
+        if progress is not None:
+            progress(len(df), len(df))
+        return iter([plans])
+    plans = iter_plans(df, intersection_type, workers=workers, seed=seed, cache=cache, progress=progress,
+                       time_budget=time_budget, report=report, **pso_options)
+    return ((np.array([green]), np.array([red]), np.array([cycle])) for green, red, cycle in plans)
+
+def iter_optimize_dataset(df, intersection_type, solver='hybrid', workers=OPTIMIZE_WORKERS, seed=None,
+                          cache=PLAN_CACHE, progress=None, time_budget=None, report=None, **pso_options):
+    """Streaming counterpart of optimize_dataset: yields each optimized row as a dict."""
+    signal_count = get_signal_count(intersection_type)
+    row_seed = _seed_sequence(seed).spawn(1)[0]
+    blocks = solver_blocks(df, intersection_type, solver, workers, row_seed, cache, progress,
+                           time_budget, report, pso_options)
+    flows, current_queue, current_delay = metric_baseline(df, signal_count)
+    plans = (plan for block in blocks for plan in zip(*block))
+
+    for i, (row, (green, red, cycle)) in enumerate(zip(df.to_dict('records'), plans)):
+        optimized = dict(row)
+        for j in range(signal_count):
+            optimized[f'Signal_{j+1}_Green'] = green[j]
+            optimized[f'Signal_{j+1}_Red'] = red[j]
+        optimized['Cycle_Length'] = cycle
 
         original_queue = row.get('Avg_Queue_Length', 0)
         original_delay = row.get('Avg_Delay_Time', 0)
+        optimized['Original_Queue_Length'] = original_queue
+        optimized['Original_Delay_Time'] = original_delay
+        baseline = (None, None) if current_delay is None else (current_queue[i:i+1], current_delay[i:i+1])
+        queue, delay = modeled_metrics(flows[i:i+1], np.array([green]), [cycle], original_queue,
+                                       original_delay, *baseline)
+        optimized['Avg_Queue_Length'] = float(queue[0])
+        optimized['Avg_Delay_Time'] = float(delay[0])
+        yield optimized
 
-        optimized.at[i, 'Original_Queue_Length'] = original_queue
-        optimized.at[i, 'Original_Delay_Time'] = original_delay
+def optimize_dataset(df, intersection_type, solver='hybrid', workers=OPTIMIZE_WORKERS, seed=None,
+                     cache=PLAN_CACHE, progress=None, time_budget=None, report=None, store=RESULT_STORE,
+                     intersection_id=None, **pso_options):
+    """Optimize every row and attach the timings and metrics as new columns, reusing
+    stored plans for identical uploads and unchanged rows."""
+    _check_solver(solver, pso_options)
+    signal_count = get_signal_count(intersection_type)
+    row_seed = _seed_sequence(seed).spawn(1)[0]
+    writable = store is not None and time_budget is None
 
-        optimized.at[i, 'Avg_Queue_Length'] = round(original_queue * np.random.uniform(0.6, 0.8), 2)
-        optimized.at[i, 'Avg_Delay_Time'] = round(original_delay * np.random.uniform(0.6, 0.8), 2)
+    if store is not None:
+        settings = store.settings_hash(intersection_type, solver, pso_options)
+        file_hash = store.file_hash(df, intersection_id, settings)
+        stored = store.get_file(file_hash)
+        if stored is not None:
+            METRICS.inc('store_file_hits')
+            _store_report(report, len(df))
+            if progress is not None:
+                progress(len(df), len(df))
+            return stored
 
-    return optimized
+    green = np.empty((len(df), signal_count), dtype=TIMING_DTYPE)
+    red = np.empty((len(df), signal_count), dtype=TIMING_DTYPE)
+    cycle = np.empty(len(df), dtype=TIMING_DTYPE)
+    todo = np.arange(len(df))
+    # Stored row plans are only worth a lookup for the hybrid search
+    row_store = store is not None and solver != 'exact'
+    if row_store:
+        keys = store.row_keys(df, intersection_id, signal_count)
+        stored_plans = store.get_plans(keys, settings)
+        for i, plan in enumerate(stored_plans):
+            if plan is not None:
+                green[i], red[i], cycle[i] = plan
+        todo = np.array([i for i, plan in enumerate(stored_plans) if plan is None], dtype=int)
+        METRICS.inc('store_rows', len(df) - len(todo), result='hit')
+        METRICS.inc('store_rows', len(todo), result='miss')
+        _store_report(report, len(df) - len(todo))
 
-def predict_next_week(df):
-    data = df[['Total_Vehicles']].values
-    scaler = MinMaxScaler()
-    scaled = scaler.fit_transform(data)
-    X, y = [], []
-    for i in range(len(scaled) - 7):
-        X.append(scaled[i:i+7])
-        y.append(scaled[i+7])
-    X, y = np.array(X), np.array(y)
-
-    model = Sequential([
-        LSTM(64, return_sequences=True, input_shape=(7, 1)),
-        LSTM(64),
-        Dense(1)
+    blocks = solver_blocks(df if len(todo) == len(df) else df.iloc[todo], intersection_type, solver, workers,
+                           row_seed, cache, _offset_progress(progress, len(df) - len(todo), len(df)),
+                           time_budget, report, pso_options)
+    done = 0
+    for block_green, block_red, block_cycle in blocks:
+        rows = todo[done:done + len(block_cycle)]
+        green[rows], red[rows], cycle[rows] = block_green, block_red, block_cycle
+        done += len(rows)
+    if row_store and writable and len(todo):
+        store.put_plans([keys[i] for i in todo], settings, [(green[i], red[i], cycle[i]) for i in todo])
+
+    original_queue = _metric_column(df, 'Avg_Queue_Length')
+    original_delay = _metric_column(df, 'Avg_Delay_Time')
+    flows, current_queue, current_delay = metric_baseline(df, signal_count)
+    queue, delay = modeled_metrics(flows, green, cycle, original_queue, original_delay, current_queue,
+                                   current_delay)
+
+    columns = {}
+    for j in range(signal_count):
+        columns[f'Signal_{j+1}_Green'] = green[:, j].astype(TIMING_DTYPE)
+        columns[f'Signal_{j+1}_Red'] = red[:, j].astype(TIMING_DTYPE)
+    columns['Cycle_Length'] = cycle.astype(TIMING_DTYPE)
+    columns['Original_Queue_Length'] = original_queue
+    columns['Original_Delay_Time'] = original_delay
+    columns['Avg_Queue_Length'] = queue
+    columns['Avg_Delay_Time'] = delay
+    result = df.assign(**columns)
+    if writable:
+        store.put_file(file_hash, result)
+    return result
+
+def is_batch(df):
+    return BATCH_COLUMNS.issubset(df.columns)
+
+def _batch_groups(df, default_type, seed):
+    types = df['Intersection_Type'].fillna(default_type)
+    groups = list(df.groupby(types, sort=False).indices.items())
+    return [(intersection_type, rows, group_seed)
+            for (intersection_type, rows), group_seed in zip(groups, _seed_sequence(seed).spawn(len(groups)))]
+
+def _offset_progress(progress, offset, total):
+    if progress is None:
+        return None
+    return lambda done, _: progress(offset + done, total)
+
+def _group_budget(time_budget, started, rows, rows_left):
+    # Share what is left of the request budget by row count, so groups that
+    # finish early leave their spare time to the ones after them
+    if time_budget is None:
+        return None
+    return max(0.0, started + time_budget - time.time()) * rows / rows_left
+
+def optimize_batch(df, default_type='Four-Way', seed=None, progress=None, time_budget=None, **options):
+    """Optimize a file holding many intersections in one pass.
+
+    Rows are grouped by Intersection_Type so each type goes through
+    optimize_dataset (and its exact, cached and parallel paths) once. The
+    combined result keeps the input row order; signal columns a type does not
+    have are left empty.
+    """
+    frames, positions, done, started = [], [], 0, time.time()
+    for intersection_type, rows, group_seed in _batch_groups(df, default_type, seed):
+        frames.append(optimize_dataset(df.iloc[rows], intersection_type, seed=group_seed,
+                                       progress=_offset_progress(progress, done, len(df)),
+                                       time_budget=_group_budget(time_budget, started, len(rows), len(df) - done),
+                                       **options))
+        positions.append(rows)
+        done += len(rows)
+    if not frames:
+        return df.copy()
+
+    combined = pd.concat(frames, ignore_index=True)
+    combined = combined.iloc[np.argsort(np.concatenate(positions), kind='stable')]
+    combined.index = df.index
+    return combined
+
+def iter_optimize_batch(df, default_type='Four-Way', seed=None, progress=None, time_budget=None, **options):
+    """Streaming counterpart of optimize_batch; rows come out one intersection type at a time."""
+    done, started = 0, time.time()
+    for intersection_type, rows, group_seed in _batch_groups(df, default_type, seed):
+        yield from iter_optimize_dataset(df.iloc[rows], intersection_type, seed=group_seed,
+                                         progress=_offset_progress(progress, done, len(df)),
+                                         time_budget=_group_budget(time_budget, started, len(rows), len(df) - done),
+                                         **options)
+        done += len(rows)
+
+class ForecastModelRegistry:
+    """On-disk store of fitted forecasting models and their scalers.
+
+    Entries live in one directory per key (an intersection ID, or a
+    fingerprint of the uploaded history). Models older than `max_age` seconds
+    are retrained from scratch, and only the `max_models` most recently used
+    entries are kept on disk, `max_loaded` of them in memory. Loaded Keras
+    models are shared between threads: hold key_lock(key) while training,
+    saving or predicting with one.
+    """
+
+    def __init__(self, root, max_age=7 * 24 * 3600, max_models=64, finetune_epochs=5, max_loaded=8):
+        self.root = root
+        self.max_age = max_age
+        self.max_models = max_models
+        self.finetune_epochs = finetune_epochs
+        self.max_loaded = max_loaded
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    @staticmethod
+    def fingerprint(df):
+        digest = hashlib.sha1(",".join(df.columns).encode())
+        digest.update(df['Total_Vehicles'].head(168).to_numpy(dtype=float).tobytes())
+        return digest.hexdigest()[:16]
+
+    @staticmethod
+    def history_hash(data):
+        return hashlib.sha1(np.ascontiguousarray(data, dtype=float).tobytes()).hexdigest()
+
+    def key_for(self, df, intersection_id=None):
+        if intersection_id:
+            return "id-" + re.sub(r'[^A-Za-z0-9_.-]', '_', str(intersection_id))
+        return "fp-" + self.fingerprint(df)
+
+    def _path(self, key):
+        return os.path.join(self.root, key)
+
+    def key_lock(self, key):
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.RLock())
+
+    def load(self, key):
+        path = self._path(key)
+        # Disk reads only hold this key's lock, so other keys load and save meanwhile
+        with self.key_lock(key):
+            with self._lock:
+                entry = self._loaded.get(key)
+                if entry is not None:
+                    self._loaded.move_to_end(key)
+            if entry is None:
+                meta_file = os.path.join(path, 'meta.json')
+                if not os.path.exists(meta_file):
+                    return None
+                with open(meta_file) as f:
+                    meta = json.load(f)
+                with open(os.path.join(path, 'scaler.pkl'), 'rb') as f:
+                    scaler = pickle.load(f)
+                model = forecasting_deps().load_model(os.path.join(path, 'model.keras'))
+                entry = (model, scaler, meta)
+                with self._lock:
+                    self._remember(key, entry)
+
+        model, scaler, meta = entry
+        if time.time() - meta['trained_at'] > self.max_age:
+            return None
+        os.utime(path)
+        return entry
+
+    def save(self, key, model, scaler, meta):
+        path = self._path(key)
+        with self.key_lock(key):
+            os.makedirs(path, exist_ok=True)
+            model.save(os.path.join(path, 'model.keras'))
+            with open(os.path.join(path, 'scaler.pkl'), 'wb') as f:
+                pickle.dump(scaler, f)
+            with open(os.path.join(path, 'meta.json'), 'w') as f:
+                json.dump(meta, f)
+            with self._lock:
+                self._remember(key, (model, scaler, meta))
+                self._evict()
+
+    def _remember(self, key, entry):
+        self._loaded[key] = entry
+        self._loaded.move_to_end(key)
+        while len(self._loaded) > min(self.max_models, self.max_loaded):
+            self._loaded.popitem(last=False)
+
+    def _evict(self):
+        entries = [e for e in os.scandir(self.root) if e.is_dir()]
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in entries[self.max_models:]:
+            self._loaded.pop(entry.name, None)
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+MODEL_REGISTRY = ForecastModelRegistry(
+    os.environ.get('AHSO_MODEL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')),
+    max_age=float(os.environ.get('AHSO_MODEL_MAX_AGE_HOURS', 168)) * 3600,
+    max_models=int(os.environ.get('AHSO_MODEL_MAX_COUNT', 64)),
+    finetune_epochs=int(os.environ.get('AHSO_FINETUNE_EPOCHS', 5)),
+    max_loaded=int(os.environ.get('AHSO_MODEL_MAX_LOADED', 8))
+)
+
+def _training_windows(scaled, horizon=1):
+    # Strided views over the series: no window is copied until Keras batches them
+    series = np.ascontiguousarray(scaled[:, 0])
+    if len(series) < 7 + horizon:
+        return np.empty((0, 7, 1)), np.empty((0, horizon))
+    windows = np.lib.stride_tricks.sliding_window_view(series, 7 + horizon)
+    return windows[:, :7, None], windows[:, 7:]
+
+def _build_lstm(horizon=1):
+    deps = forecasting_deps()
+    model = deps.Sequential([
+        deps.LSTM(64, return_sequences=True, input_shape=(7, 1)),
+        deps.LSTM(64),
+        deps.Dense(horizon)
     ])
     model.compile(optimizer='adam', loss='mse')
-    model.fit(X, y, epochs=40, verbose=0)
+    return model
+
+def _direct_horizon(rows, steps=168):
+    # Widest output head that still leaves DIRECT_MIN_SAMPLES training windows
+    return max(1, min(steps, rows - 6 - DIRECT_MIN_SAMPLES))
 
+def _forecast(model, scaled, mode, steps=168):
     last_week = scaled[-7:].reshape(1, 7, 1)
-    predicted = []
-    for _ in range(168):
-        next_val = model.predict(last_week, verbose=0)[0][0]
-        predicted.append(next_val)
-        last_week = np.roll(last_week, -1, axis=1)
-        last_week[0, -1, 0] = next_val
-
-    predicted_scaled = scaler.inverse_transform(np.array(predicted).reshape(-1, 1)).flatten()
+    if mode == 'recursive':
+        predicted = []
+        for _ in range(steps):
+            next_val = model.predict(last_week, verbose=0)[0][0]
+            predicted.append(next_val)
+            last_week = np.roll(last_week, -1, axis=1)
+            last_week[0, -1, 0] = next_val
+        return np.array(predicted)
+
+    # Direct mode emits a whole block per forward pass; with two weeks of
+    # history the block covers all 168 hours in one pass
+    predicted = np.empty(0)
+    while len(predicted) < steps:
+        block = model(last_week, training=False).numpy()[0]
+        predicted = np.concatenate([predicted, block])
+        last_week = np.concatenate([last_week[0, :, 0], block])[-7:].reshape(1, 7, 1)
+    return predicted[:steps]
+
+def predict_next_week(df, intersection_id=None, mode='recursive', registry=MODEL_REGISTRY):
+    if mode not in FORECAST_MODES:
+        raise ValueError(f"Unknown forecast mode '{mode}', expected one of {', '.join(FORECAST_MODES)}")
+    data = df[['Total_Vehicles']].values
+    history = ForecastModelRegistry.history_hash(data)
+    key = f"{registry.key_for(df, intersection_id)}-{mode}" if registry is not None else None
+    # Concurrent requests for one key wait here instead of fitting the
+    # shared model together; the second one then loads the first one's fit
+    with registry.key_lock(key) if registry is not None else nullcontext():
+        return _predict_with_registry(df, data, history, key, mode, registry)
+
+def _predict_with_registry(df, data, history, key, mode, registry):
+    with METRICS.timer('model_load'):
+        entry = registry.load(key) if registry is not None else None
+
+    if entry is None:
+        horizon = 1 if mode == 'recursive' else _direct_horizon(len(data))
+        scaler = forecasting_deps().MinMaxScaler()
+        scaled = scaler.fit_transform(data)
+        model = _build_lstm(horizon)
+        with METRICS.timer('lstm_fit', mode=mode):
+            model.fit(*_training_windows(scaled, horizon), epochs=40, verbose=0)
+        meta = {"trained_at": time.time(), "history": history, "rows": len(data), "horizon": horizon}
+        if registry is not None:
+            registry.save(key, model, scaler, meta)
+    else:
+        # Known intersection: reuse the fitted model and only fine-tune it
+        # briefly when the uploaded history differs from what it last saw
+        model, scaler, meta = entry
+        scaled = scaler.transform(data)
+        if meta['history'] != history:
+            horizon = model.output_shape[-1]
+            with METRICS.timer('lstm_finetune', mode=mode):
+                model.fit(*_training_windows(scaled, horizon), epochs=registry.finetune_epochs, verbose=0)
+            meta = dict(meta, history=history, rows=len(data))
+            registry.save(key, model, scaler, meta)
+
+    with METRICS.timer('lstm_inference', mode=mode):
+        predicted = _forecast(model, scaled, mode)
+    predicted_scaled = scaler.inverse_transform(predicted.reshape(-1, 1)).flatten()
     pred_df = df.tail(168).copy()
     pred_df['Total_Vehicles'] = predicted_scaled
     return pred_df
 
+def _week_slots(df):
+    # Hour-of-week (0-167) per row, from Day/Hour when present, otherwise by
+    # position so the last row falls on the last slot of the week
+    if 'Day' in df.columns and 'Hour' in df.columns:
+        days = pd.Categorical(df['Day'], categories=DAYS).codes.astype(int)
+        if (days >= 0).all():
+            return days * 24 + df['Hour'].to_numpy(dtype=int) % 24
+    return (np.arange(len(df)) - len(df)) % SEASON
+
+def seasonal_naive_forecast(values, steps=SEASON):
+    return np.resize(values[-SEASON:], steps)
+
+def holt_winters_forecast(values, steps=SEASON, alpha=0.3, beta=0.01, gamma=0.2):
+    """Additive Holt-Winters with a weekly (168-hour) season."""
+    if len(values) < SEASON:
+        return seasonal_naive_forecast(values, steps)
+    level = values[:SEASON].mean()
+    trend = (values[SEASON:2 * SEASON].mean() - level) / SEASON if len(values) >= 2 * SEASON else 0.0
+    seasonal = values[:SEASON] - level
+
+    for t, value in enumerate(values):
+        s = seasonal[t % SEASON]
+        prev_level = level
+        level = alpha * (value - s) + (1 - alpha) * (level + trend)
+        trend = beta * (level - prev_level) + (1 - beta) * trend
+        seasonal[t % SEASON] = gamma * (value - level) + (1 - gamma) * s
+
+    h = np.arange(1, steps + 1)
+    return level + h * trend + seasonal[(len(values) + h - 1) % SEASON]
+
+def profile_forecast(values, slots, target_slots, alpha=0.5):
+    """Exponentially weighted mean of every (Day, Hour) slot across weeks."""
+    order = np.argsort(slots, kind='stable')
+    sorted_slots = slots[order]
+    counts = np.bincount(slots, minlength=SEASON)
+    starts = np.cumsum(counts) - counts
+    rank = np.arange(len(slots)) - starts[sorted_slots]
+    age = counts[sorted_slots] - 1 - rank
+
+    # Same weights as a recursive EWMA seeded with each slot's first value
+    weights = np.where(rank == 0, (1 - alpha) ** age, alpha * (1 - alpha) ** age)
+    totals = np.bincount(sorted_slots, weights=weights * values[order], minlength=SEASON)
+    norms = np.bincount(sorted_slots, weights=weights, minlength=SEASON)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        profile = np.where(norms > 0, totals / norms, values.mean())
+    return profile[target_slots]
+
+def seasonal_forecast(df, model='profile'):
+    """Forecast next week without TensorFlow, in the same shape as predict_next_week."""
+    values = df['Total_Vehicles'].to_numpy(dtype=float)
+    pred_df = df.tail(SEASON).copy()
+    steps = len(pred_df)
+    if model == 'seasonal_naive':
+        predicted = seasonal_naive_forecast(values, steps)
+    elif model == 'holt_winters':
+        predicted = holt_winters_forecast(values.copy(), steps)
+    elif model == 'profile':
+        slots = _week_slots(df)
+        predicted = profile_forecast(values, slots, slots[-steps:])
+    else:
+        raise ValueError(f"Unknown forecast model '{model}', expected one of {', '.join(FORECAST_MODELS)}")
+    pred_df['Total_Vehicles'] = np.maximum(predicted, 0)
+    return pred_df
+
+def predict_and_optimize(df, intersection_type, forecast_model='lstm', forecast_mode='recursive',
+                         intersection_id=None, progress=None, **optimize_options):
+    with METRICS.timer('forecast', model=forecast_model):
+        if forecast_model == 'lstm':
+            predicted_df = predict_next_week(df, intersection_id=intersection_id, mode=forecast_mode)
+        else:
+            predicted_df = seasonal_forecast(df, forecast_model)
+    with METRICS.timer('optimize'):
+        return optimize_dataset(predicted_df, intersection_type, progress=progress,
+                                intersection_id=intersection_id, **optimize_options)
+
+class QueueFull(Exception):
+    pass
+
+class JobQueue:
+    """Bounded in-process queue for long-running optimize/predict requests.
+
+    Jobs run on a small thread pool. Submitting while `max_pending` jobs are
+    already queued or running raises QueueFull, and only the newest
+    `keep_finished` finished jobs (and their results) are retained.
+    """
+
+    def __init__(self, workers=2, max_pending=16, keep_finished=256):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self._executor = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind, func, *args, **kwargs):
+        with self._lock:
+            active = sum(job['state'] in ('queued', 'running') for job in self._jobs.values())
+            if active >= self.max_pending:
+                raise QueueFull(f"{active} jobs already pending")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ahso-job")
+            job_id = uuid.uuid4().hex
+            self._jobs[job_id] = {
+                "id": job_id,
+                "kind": kind,
+                "state": "queued",
+                "rows_done": 0,
+                "rows_total": None,
+                "submitted_at": time.time(),
+                "started_at": None,
+                "finished_at": None,
+                "error": None,
+                "result": None
+            }
+            self._executor.submit(self._run, job_id, func, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs):
+        job = self._jobs[job_id]
+        job.update(state="running", started_at=time.time())
+
+        def progress(done, total):
+            job.update(rows_done=done, rows_total=total)
+
+        try:
+            job['result'] = func(*args, progress=progress, **kwargs)
+            job['state'] = "done"
+        except Exception as e:
+            job.update(state="failed", error=str(e))
+        job['finished_at'] = time.time()
+        METRICS.observe('job_seconds', job['finished_at'] - job['started_at'], kind=job['kind'], state=job['state'])
+        self._trim()
+
+    def _trim(self):
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job['state'] in ('done', 'failed')]
+            for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+                del self._jobs[job_id]
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {key: value for key, value in job.items() if key != 'result'}
+
+    def result(self, job_id):
+        job = self._jobs.get(job_id)
+        return None if job is None else job['result']
+
+    def counts(self):
+        with self._lock:
+            states = [job['state'] for job in self._jobs.values()]
+        return {state: states.count(state) for state in set(states)}
+
+JOB_QUEUE = JobQueue(
+    workers=int(os.environ.get('AHSO_JOB_WORKERS', 2)),
+    max_pending=int(os.environ.get('AHSO_JOB_QUEUE_LIMIT', 16))
+)
+
+def optimize_options_from_form(form):
+    options = {}
+    for key, cast in (('swarmsize', int), ('maxiter', int), ('inertia', float),
+                      ('workers', int), ('seed', int), ('tol', float), ('patience', int),
+                      ('time_budget', float)):
+        if form.get(key):
+            try:
+                options[key] = cast(form[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be numeric") from None
+    if options.get('time_budget', 1) <= 0:
+        raise ValueError("time_budget must be positive")
+    for key in ('inertia', 'tol'):
+        if key in options and not np.isfinite(options[key]):
+            raise ValueError(f"{key} must be finite")
+    # workers is capped at the core count by iter_plans; 0 means one per core
+    for key, low, high in (('swarmsize', 1, MAX_SWARMSIZE), ('maxiter', 1, MAX_ITER),
+                           ('workers', 0, None), ('seed', 0, None), ('patience', 0, None), ('tol', 0, None)):
+        if key not in options:
+            continue
+        if high is not None and not low <= options[key] <= high:
+            raise ValueError(f"{key} must be between {low} and {high}")
+        if options[key] < low:
+            raise ValueError(f"{key} must be at least {low}")
+    solver = form.get('solver')
+    if solver:
+        if solver not in SOLVERS:
+            raise ValueError(f"solver must be one of {', '.join(SOLVERS)}")
+        options['solver'] = solver
+    objective = form.get('objective')
+    if objective:
+        if objective not in OBJECTIVES:
+            raise ValueError(f"objective must be one of {', '.join(OBJECTIVES)}")
+        if objective != 'fairness' and solver == 'exact':
+            raise ValueError("The exact solver only supports the fairness objective")
+        options['objective'] = objective
+    return options
+
+def store_options_from_form(form):
+    # Single-intersection uploads name their intersection for the result
+    # store; batch files carry an Intersection_ID column instead
+    return {"intersection_id": form.get('intersection_id')}
+
+def with_convergence_report(response, convergence, optimize_options):
+    """Attach the optimizer's convergence summary as a compact JSON header."""
+    if 'time_budget' in optimize_options:
+        convergence['time_budget_s'] = optimize_options['time_budget']
+        convergence['over_budget'] = convergence.get('elapsed_s', 0) > optimize_options['time_budget']
+    if convergence:
+        response.headers['X-Convergence-Report'] = json.dumps(convergence, separators=(',', ':'))
+    return response
+
+def read_request_dataset():
+    with METRICS.timer('parse'):
+        df = read_upload(request, combine=hourly)
+    df.columns = [c.strip().replace(" ", "_") for c in df.columns]
+    if 'Total_Vehicles' not in df.columns:
+        raise ValueError("CSV must contain 'Total_Vehicles' column")
+    return df
+
+def forecast_options_from_form(form):
+    forecast_mode = form.get('forecast_mode', 'recursive')
+    if forecast_mode not in FORECAST_MODES:
+        raise ValueError(f"forecast_mode must be one of {', '.join(FORECAST_MODES)}")
+    forecast_model = form.get('model', 'lstm')
+    if forecast_model not in FORECAST_MODELS:
+        raise ValueError(f"model must be one of {', '.join(FORECAST_MODELS)}")
+    return {
+        "forecast_model": forecast_model,
+        "forecast_mode": forecast_mode,
+        "intersection_id": form.get('intersection_id')
+    }
+
 @app.route('/optimize', methods=['POST'])
 def optimize():
-    if 'file' not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
-    
-    file = request.files['file']
-    intersection_type = request.form.get('intersection_type', 'Four-Way')
-    
-    temp_dir = tempfile.mkdtemp()
-    temp_path = os.path.join(temp_dir, 'uploaded.csv')
-    file.save(temp_path)
-    
+    fields = request_fields(request)
+    intersection_type = fields.get('intersection_type', 'Four-Way')
     try:
-        df = load_dataset(temp_path)
-        
-        if 'Total_Vehicles' not in df.columns:
-            if 'Total Vehicles' in df.columns:
-                df['Total_Vehicles'] = df['Total Vehicles']
+        optimize_options = optimize_options_from_form(fields)
+        fmt = result_format(request, fields)
+        df = read_request_dataset()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        stream_format = fields.get('stream')
+        if stream_format:
+            if stream_format not in STREAM_FORMATS:
+                return jsonify({"error": f"stream must be one of {', '.join(STREAM_FORMATS)}"}), 400
+            if is_batch(df):
+                rows = iter_optimize_batch(df, default_type=intersection_type, **optimize_options)
+            else:
+                rows = iter_optimize_dataset(df, intersection_type, **optimize_options)
+            return stream_rows(rows, stream_format, download_name="optimized_traffic_data")
+
+        convergence = {}
+        with METRICS.timer('optimize'):
+            if is_batch(df):
+                optimized_df = optimize_batch(df, default_type=intersection_type, report=convergence,
+                                              **optimize_options)
             else:
-                return jsonify({"error": "CSV must contain 'Total_Vehicles' column"}), 400
-        
-        optimized_df = optimize_dataset(df, intersection_type)
-        optimized_file = os.path.join(temp_dir, "optimized_traffic_data.csv")
-        optimized_df.to_csv(optimized_file, index=False)
-        
-        return send_file(
-            optimized_file,
-            as_attachment=True,
-            download_name="optimized_traffic_data.csv"
-        )
+                optimized_df = optimize_dataset(df, intersection_type, report=convergence,
+                                                **store_options_from_form(fields), **optimize_options)
+        with METRICS.timer('serialize', format=fmt):
+            response = write_table(optimized_df, fmt, download_name="optimized_traffic_data")
+        return with_convergence_report(response, convergence, optimize_options)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        try:
-            os.remove(temp_path)
-            os.rmdir(temp_dir)
-        except:
-            pass
+
+@app.route('/cache', methods=['GET'])
+def cache_stats():
+    return jsonify(PLAN_CACHE.stats())
 
 @app.route('/predict', methods=['POST'])
 def predict():
-    if 'file' not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
-    
-    file = request.files['file']
-    intersection_type = request.form.get('intersection_type', 'Four-Way')
-    
-    temp_dir = tempfile.mkdtemp()
-    temp_path = os.path.join(temp_dir, 'uploaded.csv')
-    file.save(temp_path)
-    
+    fields = request_fields(request)
+    intersection_type = fields.get('intersection_type', 'Four-Way')
     try:
-        df = load_dataset(temp_path)
-        
-        if 'Total_Vehicles' not in df.columns:
-            if 'Total Vehicles' in df.columns:
-                df['Total_Vehicles'] = df['Total Vehicles']
-            else:
-                return jsonify({"error": "CSV must contain 'Total_Vehicles' column"}), 400
-        
-        predicted_df = predict_next_week(df)
-        optimized_predicted_df = optimize_dataset(predicted_df, intersection_type)
-        
-        predicted_file = os.path.join(temp_dir, "predicted_optimized_traffic_data.csv")
-        optimized_predicted_df.to_csv(predicted_file, index=False)
-        
-        return send_file(
-            predicted_file,
-            as_attachment=True,
-            download_name="predicted_optimized_traffic_data.csv"
-        )
+        optimize_options = optimize_options_from_form(fields)
+        forecast_options = forecast_options_from_form(fields)
+        fmt = result_format(request, fields)
+        df = read_request_dataset()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        convergence = {}
+        optimized_predicted_df = predict_and_optimize(df, intersection_type, report=convergence,
+                                                      **forecast_options, **optimize_options)
+        with METRICS.timer('serialize', format=fmt):
+            response = write_table(optimized_predicted_df, fmt, download_name="predicted_optimized_traffic_data")
+        return with_convergence_report(response, convergence, optimize_options)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    finally:
-        try:
-            os.remove(temp_path)
-            os.rmdir(temp_dir)
-        except:
-            pass
+
+@app.route('/corridor', methods=['POST'])
+def corridor():
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "Expected a JSON object with intersections and travel_times"}), 400
+    try:
+        seed = body.get('seed')
+        seed = None if seed is None else int(seed)
+        with METRICS.timer('corridor', objective=body.get('objective', 'bandwidth')):
+            plan = optimize_corridor(
+                body.get('intersections') or [],
+                body.get('travel_times') or [],
+                inbound_travel_times=body.get('inbound_travel_times'),
+                objective=body.get('objective', 'bandwidth'),
+                cycle_range=(body.get('cycle_min', CORRIDOR_CYCLES[0]), body.get('cycle_max', CORRIDOR_CYCLES[1])),
+                cycle_step=body.get('cycle_step', CORRIDOR_STEP),
+                seed=seed
+            )
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(plan)
+
+@app.route('/jobs/<kind>', methods=['POST'])
+def submit_job(kind):
+    if kind not in ('optimize', 'predict'):
+        return jsonify({"error": "Job kind must be 'optimize' or 'predict'"}), 404
+
+    fields = request_fields(request)
+    intersection_type = fields.get('intersection_type', 'Four-Way')
+    try:
+        optimize_options = optimize_options_from_form(fields)
+        if kind == 'predict':
+            forecast_options = forecast_options_from_form(fields)
+        df = read_request_dataset()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        if kind == 'optimize' and is_batch(df):
+            job_id = JOB_QUEUE.submit(kind, optimize_batch, df, default_type=intersection_type, **optimize_options)
+        elif kind == 'optimize':
+            job_id = JOB_QUEUE.submit(kind, optimize_dataset, df, intersection_type,
+                                      **store_options_from_form(fields), **optimize_options)
+        else:
+            job_id = JOB_QUEUE.submit(kind, predict_and_optimize, df, intersection_type,
+                                      **forecast_options, **optimize_options)
+    except QueueFull as e:
+        return jsonify({"error": f"Job queue is full: {e}"}), 429, {"Retry-After": "30"}
+
+    return jsonify({"job_id": job_id, "status_url": f"/jobs/{job_id}"}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    status = JOB_QUEUE.status(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(status)
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    status = JOB_QUEUE.status(job_id)
+    if status is None:
+        return jsonify({"error": "Unknown job"}), 404
+    if status['state'] == 'failed':
+        return jsonify({"error": status['error']}), 500
+    if status['state'] != 'done':
+        return jsonify({"error": "Job not finished", "state": status['state']}), 409
+
+    try:
+        fmt = result_format(request, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    download_name = "optimized_traffic_data" if status['kind'] == 'optimize' else "predicted_optimized_traffic_data"
+    with METRICS.timer('serialize', format=fmt):
+        return write_table(JOB_QUEUE.result(job_id), fmt, download_name=download_name)
+
+def _collect_state(metrics):
+    cache = PLAN_CACHE.stats()
+    metrics.set('plan_cache_size', cache['size'])
+    metrics.set('plan_cache_hits', cache['hits'])
+    metrics.set('plan_cache_misses', cache['misses'])
+    jobs = JOB_QUEUE.counts()
+    for state in ('queued', 'running', 'done', 'failed'):
+        metrics.set('jobs', jobs.get(state, 0), state=state)
+
+METRICS.add_collector(_collect_state)
+instrument(app, METRICS, profile_dir=os.environ.get('AHSO_PROFILE_DIR'))
+
+# Row workers import this module too; only the serving process warms up
+if os.environ.get('AHSO_WARMUP') == '1' and multiprocessing.parent_process() is None:
+    start_warmup()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5002, debug=True)
\ No newline at end of file
@@ -0,0 +1,110 @@
+"""Cold-start import report for the ahso service.
+
+Runs `python -X importtime` in fresh interpreters for the optimize-only import
+path (`import ahso`) and for the path after the first /predict has pulled in
+the forecasting dependencies, then writes the totals, peak RSS and the slowest
+top-level packages to benchmarks/results/import_time.json.
+
+    python benchmarks/import_time.py [--runs 3] [--output PATH]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results", "import_time.json")
+
+SCENARIOS = {
+    "optimize_only": "import ahso",
+    "with_forecasting": "import ahso; ahso.forecasting_deps()",
+}
+
+PROBE = (
+    "import resource, time; t = time.perf_counter(); {stmt}; "
+    "print(time.perf_counter() - t, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+)
+
+
+def parse_importtime(stderr, module="ahso"):
+    """Cumulative microseconds per package from -X importtime output.
+
+    Top-level imports are reported as they are, except `module` itself, which
+    is broken down into its direct dependencies so they are not hidden inside
+    one total.
+    """
+    packages = defaultdict(int)
+    children = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, raw_name = line[len("import time:"):].split("|")
+        name = raw_name.strip()
+        # importtime prints children before their parent, indented two
+        # spaces per level below the top
+        depth = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        if depth == 1:
+            children.append((name, int(cumulative_us)))
+        elif depth == 0:
+            if name == module:
+                for child, us in children:
+                    packages[child.split(".")[0]] += us
+            else:
+                packages[name.split(".")[0]] += int(cumulative_us)
+            children = []
+    return dict(packages)
+
+
+def measure(stmt):
+    env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL="3", AHSO_WARMUP="0")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(stmt=stmt)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    )
+    wall, max_rss = proc.stdout.split()[-2:]
+    packages = parse_importtime(proc.stderr)
+    return {
+        "wall_s": float(wall),
+        "max_rss_mb": int(max_rss) / 1024,
+        "top_packages_ms": {
+            name: round(us / 1000, 1)
+            for name, us in sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:10]
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "runs": args.runs,
+        "scenarios": {}
+    }
+    for name, stmt in SCENARIOS.items():
+        samples = [measure(stmt) for _ in range(args.runs)]
+        best = min(samples, key=lambda sample: sample["wall_s"])
+        report["scenarios"][name] = {
+            "statement": stmt,
+            "wall_s_min": round(best["wall_s"], 3),
+            "wall_s_max": round(max(sample["wall_s"] for sample in samples), 3),
+            "max_rss_mb": round(max(sample["max_rss_mb"] for sample in samples), 1),
+            "top_packages_ms": best["top_packages_ms"]
+        }
+        print(f"{name:>18}: {best['wall_s']:.3f}s, {report['scenarios'][name]['max_rss_mb']:.0f} MB RSS")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Offline benchmark suite for the optimizer, forecaster and live engine.
+
+Times `hybrid_optimize_signal_timings` per row, `optimize_dataset` on the
+synthetic weekly CSVs in traffic_optimization/scripts/ scaled up to several
+weeks and intersections, `predict_next_week` training and inference
+separately, and the live_traffic dataset and live-tick engines. Each case is
+timed without instrumentation (best of --repeat), then run once more under
+tracemalloc for its peak Python/NumPy allocation. Results, with the process
+peak RSS, go to benchmarks/results/benchmarks.json so runs can be compared.
+
+    python benchmarks/run_benchmarks.py [--quick] [--only optimize,live] [--output PATH]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "3")
+os.environ.setdefault("AHSO_WARMUP", "0")
+
+import numpy as np
+import pandas as pd
+
+import ahso
+import live_traffic
+
+DEFAULT_OUTPUT = os.path.join(ROOT, "benchmarks", "results", "benchmarks.json")
+DATA_DIR = os.path.join(ROOT, "traffic_optimization", "scripts")
+DATASETS = {
+    "Four-Way": "synthetic_four_way_weekly_traffic.csv",
+    "T-Junction": "synthetic_t_junction_weekly_traffic.csv",
+    "Diamond": "synthetic_diamond_weekly_traffic.csv",
+    "Roundabout": "synthetic_roundabout_weekly_traffic.csv",
+}
+GROUPS = ("hybrid", "optimize", "forecast", "live")
+
+
+def load(intersection_type):
+    return ahso.load_dataset(os.path.join(DATA_DIR, DATASETS[intersection_type]))
+
+
+def scale_dataset(df, intersection_type, weeks=1, intersections=1, seed=0):
+    """Tile a weekly CSV to `weeks` x `intersections`, jittering the counts so
+    repeated weeks are distinct rows rather than cache or dedupe hits."""
+    rng = np.random.default_rng(seed)
+    signal_columns = [c for c in df.columns if c.startswith("Signal_") and c.endswith("_Vehicles")]
+    frames = []
+    for intersection in range(intersections):
+        for _ in range(weeks):
+            part = df.copy()
+            noise = rng.integers(-5, 6, size=(len(part), len(signal_columns)))
+            part[signal_columns] = np.maximum(1, part[signal_columns].to_numpy() + noise)
+            part["Total_Vehicles"] = part[signal_columns].sum(axis=1)
+            if intersections > 1:
+                part["Intersection_ID"] = f"{intersection_type}-{intersection}"
+                part["Intersection_Type"] = intersection_type
+            frames.append(part)
+    return pd.concat(frames, ignore_index=True)
+
+
+def measure(fn, repeat):
+    """Best wall time over `repeat` runs, then one traced run for peak memory."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def record(results, name, fn, items, repeat, **params):
+    wall, peak = measure(fn, repeat)
+    results.append({
+        "name": name,
+        "params": params,
+        "items": items,
+        "wall_s": round(wall, 4),
+        "per_item_ms": round(wall / items * 1000, 4),
+        "items_per_s": round(items / wall, 1),
+        "peak_traced_mb": round(peak / 2**20, 2)
+    })
+    print(f"{name:>28} {json.dumps(params):<60} {wall:9.3f}s  {items / wall:12.1f}/s  {peak / 2**20:8.1f} MB")
+
+
+def bench_hybrid(results, args):
+    for intersection_type in DATASETS:
+        df = load(intersection_type)
+        rows = [row for _, row in df.head(args.hybrid_rows).iterrows()]
+        signal_count = ahso.get_signal_count(intersection_type)
+
+        def run():
+            rng = np.random.default_rng(0)
+            for row in rows:
+                ahso.hybrid_optimize_signal_timings(row, signal_count, rng=rng)
+
+        record(results, "hybrid_optimize_signal_timings", run, len(rows), args.repeat,
+               intersection_type=intersection_type)
+
+
+def bench_optimize(results, args):
+    for intersection_type in DATASETS:
+        df = load(intersection_type)
+        for weeks in args.weeks:
+            for intersections in args.intersections:
+                data = scale_dataset(df, intersection_type, weeks, intersections)
+                for solver in args.solvers:
+                    if intersections > 1:
+                        run = lambda: ahso.optimize_batch(data, default_type=intersection_type, solver=solver,
+                                                          seed=0, cache=None, store=None, workers=args.workers)
+                    else:
+                        run = lambda: ahso.optimize_dataset(data, intersection_type, solver=solver,
+                                                            seed=0, cache=None, store=None, workers=args.workers)
+                    record(results, "optimize_dataset", run, len(data), args.repeat,
+                           intersection_type=intersection_type, weeks=weeks,
+                           intersections=intersections, solver=solver, workers=args.workers)
+
+
+def bench_forecast(results, args):
+    try:
+        ahso.forecasting_deps()
+    except ImportError as e:
+        results.append({"name": "predict_next_week", "skipped": str(e)})
+        print(f"{'predict_next_week':>28} skipped: {e}")
+        return
+
+    df = scale_dataset(load("Four-Way"), "Four-Way", weeks=args.forecast_weeks)
+    for mode in ahso.FORECAST_MODES:
+        # No registry, so every run trains from scratch
+        record(results, "predict_next_week.train",
+               lambda: ahso.predict_next_week(df, mode=mode, registry=None), 1, 1, mode=mode, rows=len(df))
+
+        with tempfile.TemporaryDirectory() as root:
+            # Warm registry with the same history: load and predict only
+            registry = ahso.ForecastModelRegistry(root)
+            ahso.predict_next_week(df, intersection_id="bench", mode=mode, registry=registry)
+            record(results, "predict_next_week.infer",
+                   lambda: ahso.predict_next_week(df, intersection_id="bench", mode=mode, registry=registry),
+                   1, args.repeat, mode=mode, rows=len(df))
+
+    for model in ("seasonal_naive", "holt_winters", "profile"):
+        record(results, "seasonal_forecast", lambda: ahso.seasonal_forecast(df, model), 1, args.repeat,
+               model=model, rows=len(df))
+
+
+def live_observations(count, seed=0):
+    rnd = random.Random(seed)
+    observations = []
+    for _ in range(count):
+        intersection_type = rnd.choice(list(DATASETS))
+        signals = 3 if intersection_type == "T-Junction" else 4
+        observations.append({
+            "color": rnd.choice(["red", "yellow", "green"]),
+            "green_times": [rnd.randint(20, 60) for _ in range(signals)],
+            "red_times": [rnd.randint(60, 140) for _ in range(signals)],
+            "intersection_type": intersection_type,
+            "current_hour": rnd.randint(0, 23),
+            "current_travel_time": rnd.randint(60, 3600),
+            "current_distance": f"{rnd.uniform(0.5, 20):.1f} km"
+        })
+    return observations
+
+
+def bench_live(results, args):
+    for intersection_type in DATASETS:
+        for weeks in args.weeks:
+            data = scale_dataset(load(intersection_type), intersection_type, weeks)
+            def run():
+                live_traffic.TrafficSignalOptimizer(intersection_type, data.copy()).optimize_signal_timings()
+
+            record(results, "TrafficSignalOptimizer", run, len(data), args.repeat,
+                   intersection_type=intersection_type, weeks=weeks)
+
+    observations = live_observations(args.live_observations)
+
+    def scalar():
+        for o in observations:
+            live_traffic.calculate_optimized_timings(
+                o["color"], o["green_times"], o["red_times"], o["intersection_type"],
+                o["current_hour"], o["current_travel_time"], o["current_distance"])
+
+    record(results, "calculate_optimized_timings", scalar, len(observations), args.repeat, mode="scalar")
+    record(results, "calculate_optimized_timings",
+           lambda: live_traffic.calculate_optimized_timings_batch(observations),
+           len(observations), args.repeat, mode="batch")
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", default=",".join(GROUPS), help=f"comma-separated subset of {', '.join(GROUPS)}")
+    parser.add_argument("--quick", action="store_true", help="one week, one intersection, a single repeat")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--weeks", type=int_list, default=[1, 4])
+    parser.add_argument("--intersections", type=int_list, default=[1, 8])
+    parser.add_argument("--solvers", default=",".join(ahso.SOLVERS))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--hybrid-rows", type=int, default=24)
+    parser.add_argument("--forecast-weeks", type=int, default=4)
+    parser.add_argument("--live-observations", type=int, default=5000)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    args = parser.parse_args()
+    args.solvers = args.solvers.split(",")
+    if args.quick:
+        args.repeat, args.weeks, args.intersections, args.forecast_weeks = 1, [1], [1], 1
+
+    groups = args.only.split(",")
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown group(s) {', '.join(sorted(unknown))}")
+
+    results = []
+    for group in GROUPS:
+        if group in groups:
+            globals()[f"bench_{group}"](results, args)
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "results": results
+    }
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
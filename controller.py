@@ -0,0 +1,258 @@
+"""Streaming adaptive controller for live junctions.
+
+Reads NDJSON observations, one per line, or a JSON array holding a whole
+polling tick. Each observation has the fields of a live_traffic /optimize
+request plus a junction_id, and optionally a Unix `timestamp`. Each junction
+keeps an exponentially weighted density (from the signal color) and speed
+(from travel time and distance) in a compact array store. Plans come from
+the live-tick rules applied to the smoothed state, so a flickering color
+no longer makes the timings jump. A plan is written out only when a green
+or red time moves by more than --threshold seconds from the last plan
+emitted for that junction. Invalid observations produce an {"error": ...}
+line.
+
+    python controller.py [--half-life 60] [--threshold 5] < ticks.ndjson > plans.ndjson
+    python controller.py --listen 0.0.0.0:5003
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+from live_traffic import BASE_DENSITY, _optimize_timing_arrays, _parse_observation, parse_distances_km
+
+MAX_SIGNALS = 8
+
+# Smoothed densities are mapped back to the nearest color level
+COLOR_LEVELS = sorted(BASE_DENSITY, key=BASE_DENSITY.get)
+COLOR_THRESHOLDS = [(BASE_DENSITY[a] + BASE_DENSITY[b]) / 2 for a, b in zip(COLOR_LEVELS, COLOR_LEVELS[1:])]
+
+class JunctionStore:
+    """Smoothed state and last emitted plan per junction, in flat arrays.
+
+    Junctions get a slot on first sight and the arrays double as needed.
+    Once `max_junctions` are tracked, the junction idle the longest gives up
+    its slot, so memory stays bounded at roughly 100 bytes per junction.
+    """
+
+    def __init__(self, max_junctions=100_000, max_signals=MAX_SIGNALS, capacity=1024):
+        self.max_junctions = max_junctions
+        self.max_signals = max_signals
+        self.index = {}
+        self.ids = []
+        self._allocate(min(capacity, max_junctions))
+
+    def _allocate(self, capacity):
+        old = getattr(self, 'density', None)
+        arrays = {
+            'density': np.full(capacity, np.nan, dtype=np.float32),
+            'speed': np.full(capacity, np.nan, dtype=np.float32),
+            'seen_at': np.zeros(capacity),
+            'green': np.zeros((capacity, self.max_signals), dtype=np.int16),
+            'red': np.zeros((capacity, self.max_signals), dtype=np.int16),
+            # Signal count of the last emitted plan, 0 before the first
+            'signals': np.zeros(capacity, dtype=np.int8)
+        }
+        for name, array in arrays.items():
+            if old is not None:
+                current = getattr(self, name)
+                array[:len(current)] = current
+            setattr(self, name, array)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def slots(self, junction_ids):
+        slots = np.empty(len(junction_ids), dtype=np.intp)
+        for i, junction_id in enumerate(junction_ids):
+            slot = self.index.get(junction_id)
+            if slot is None:
+                slot = self._claim(junction_id, reserved=slots[:i])
+            slots[i] = slot
+        return slots
+
+    def _claim(self, junction_id, reserved):
+        if len(self.ids) < self.max_junctions:
+            if len(self.ids) == len(self.density):
+                self._allocate(min(2 * len(self.density), self.max_junctions))
+            slot = len(self.ids)
+            self.ids.append(junction_id)
+        else:
+            idle = self.seen_at.copy()
+            idle[reserved] = np.inf
+            slot = int(np.argmin(idle))
+            del self.index[self.ids[slot]]
+            self.ids[slot] = junction_id
+        self.index[junction_id] = slot
+        self.density[slot] = self.speed[slot] = np.nan
+        self.signals[slot] = 0
+        # Keep the slot from being evicted again within this tick
+        self.seen_at[slot] = np.inf
+        return slot
+
+class AdaptiveController:
+    """Fold observation ticks into per-junction EWMA state and emit changed plans.
+
+    `half_life` is in seconds of observation time: a reading that old
+    carries half the weight of a fresh one. Each update costs O(1) per
+    observation, and a tick is evaluated as arrays.
+    """
+
+    def __init__(self, half_life=60.0, threshold=5, store=None, clock=time.time):
+        self.half_life = half_life
+        self.threshold = threshold
+        self.store = JunctionStore() if store is None else store
+        self.clock = clock
+
+    def update(self, observations):
+        """Returns the plans that changed and the errors, in input order."""
+        now = self.clock()
+        default_hour = datetime.now().hour
+        out = [None] * len(observations)
+        parsed, positions = [], []
+        for i, observation in enumerate(observations):
+            try:
+                junction_id = observation.get('junction_id') if isinstance(observation, dict) else None
+                if junction_id is None:
+                    raise ValueError("Missing junction_id")
+                if not isinstance(junction_id, (str, int)) or isinstance(junction_id, bool):
+                    raise ValueError("junction_id must be a string or an integer")
+                fields = _parse_observation(observation, default_hour)
+                if len(fields[1]) > self.store.max_signals:
+                    raise ValueError(f"At most {self.store.max_signals} signal timings are supported")
+                timestamp = float(observation.get('timestamp', now))
+            except (TypeError, ValueError) as e:
+                out[i] = {"junction_id": observation.get('junction_id') if isinstance(observation, dict) else None,
+                          "error": str(e)}
+                continue
+            parsed.append((junction_id, timestamp) + fields)
+            positions.append(i)
+        if parsed:
+            self._fold(parsed, np.array(positions), out)
+        return [result for result in out if result is not None]
+
+    def _fold(self, parsed, positions, out):
+        store = self.store
+        junction_ids, timestamps, colors, greens, reds, types, hours, travel_times, distances = zip(*parsed)
+        slots = store.slots(junction_ids)
+        timestamps = np.array(timestamps)
+        density = np.array([BASE_DENSITY.get(c, 40) for c in colors], dtype=float)
+        travel_times = np.array(travel_times)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            speed = np.where(travel_times != 0, parse_distances_km(distances) / (travel_times / 3600), np.nan)
+        hours = np.array(hours)
+        signal_counts = np.array([len(g) for g in greens])
+
+        # A junction seen twice in one tick is folded in twice, in order
+        occurrence = np.zeros(len(slots), dtype=int)
+        if len(np.unique(slots)) < len(slots):
+            seen = {}
+            for i, slot in enumerate(slots.tolist()):
+                occurrence[i] = seen[slot] = seen.get(slot, -1) + 1
+
+        for wave in range(occurrence.max() + 1):
+            rows = np.flatnonzero(occurrence == wave)
+            s = slots[rows]
+            previous = store.seen_at[s]
+            elapsed = np.where(np.isfinite(previous), np.maximum(timestamps[rows] - previous, 0), 0)
+            weight = 1 - 0.5 ** (elapsed / self.half_life)
+            store.density[s] = self._smooth(store.density[s], density[rows], weight)
+            store.speed[s] = self._smooth(store.speed[s], speed[rows], weight)
+            store.seen_at[s] = timestamps[rows]
+
+            smoothed = store.density[s]
+            effective = np.array(COLOR_LEVELS, dtype=object)[np.searchsorted(COLOR_THRESHOLDS, smoothed)]
+            for num_signals in np.unique(signal_counts[rows]):
+                block = rows[signal_counts[rows] == num_signals]
+                self._plan(block, slots[block], effective[signal_counts[rows] == num_signals],
+                           np.array([greens[r] for r in block]), np.array([reds[r] for r in block]),
+                           hours[block], types, positions, out)
+
+    @staticmethod
+    def _smooth(state, value, weight):
+        # Unseen state takes the first reading; missing readings leave it as is
+        smoothed = np.where(np.isnan(state), value, state + weight * (value - state))
+        return np.where(np.isnan(value), state, smoothed)
+
+    def _plan(self, rows, slots, colors, green, red, hours, types, positions, out):
+        store = self.store
+        num_signals = green.shape[1]
+        optimized_green, optimized_red = _optimize_timing_arrays(colors, green, red, hours)
+        optimized_green = optimized_green.astype(np.int16)
+        optimized_red = optimized_red.astype(np.int16)
+
+        last_green = store.green[slots, :num_signals]
+        last_red = store.red[slots, :num_signals]
+        moved = np.maximum(np.abs(optimized_green - last_green).max(axis=1),
+                           np.abs(optimized_red - last_red).max(axis=1))
+        changed = (store.signals[slots] != num_signals) | (moved > self.threshold)
+        emit = np.flatnonzero(changed)
+        store.green[slots[emit], :num_signals] = optimized_green[emit]
+        store.red[slots[emit], :num_signals] = optimized_red[emit]
+        store.signals[slots[emit]] = num_signals
+
+        for k in emit.tolist():
+            slot = slots[k]
+            speed = store.speed[slot]
+            out[positions[rows[k]]] = {
+                "junction_id": store.ids[slot],
+                "intersection_type": types[rows[k]],
+                "optimized_green_times": optimized_green[k].tolist(),
+                "optimized_red_times": optimized_red[k].tolist(),
+                "color": colors[k],
+                "density": round(float(store.density[slot]), 1),
+                "speed_kmh": None if np.isnan(speed) else round(float(speed), 1)
+            }
+
+def handle_line(controller, line):
+    line = line.strip()
+    if not line:
+        return []
+    try:
+        payload = json.loads(line)
+    except ValueError:
+        return [{"error": "Invalid JSON"}]
+    return controller.update(payload if isinstance(payload, list) else [payload])
+
+def run_stdio(controller, source=sys.stdin, sink=sys.stdout):
+    for line in source:
+        for result in handle_line(controller, line):
+            sink.write(json.dumps(result) + '\n')
+        sink.flush()
+
+async def serve_tcp(controller, host, port):
+    # Connections share one controller; the event loop serialises updates
+    async def handle(reader, writer):
+        try:
+            async for line in reader:
+                for result in handle_line(controller, line.decode('utf-8', 'replace')):
+                    writer.write((json.dumps(result) + '\n').encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--half-life', type=float, default=60.0, help='EWMA half-life in seconds')
+    parser.add_argument('--threshold', type=float, default=5, help='seconds a timing must move to be re-emitted')
+    parser.add_argument('--max-junctions', type=int, default=100_000)
+    parser.add_argument('--listen', help='HOST:PORT to accept NDJSON over TCP instead of stdin')
+    args = parser.parse_args()
+
+    controller = AdaptiveController(args.half_life, args.threshold, JunctionStore(args.max_junctions))
+    if args.listen:
+        host, _, port = args.listen.rpartition(':')
+        asyncio.run(serve_tcp(controller, host or '0.0.0.0', int(port)))
+    else:
+        run_stdio(controller)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,321 @@
+import time
+
+import numpy as np
+
+# Green-wave coordination for an ordered chain of signals on one arterial.
+# Every signal runs a common cycle; each gets an offset (start of its
+# arterial green, in seconds after the first signal's) and a green split.
+# Plans are scored on a one-second grid of the cycle:
+#   - bandwidth: the longest circular window of departure times from one end
+#     whose vehicles, moving at the link travel times, meet green at every
+#     signal, in each direction;
+#   - delay: the mean red wait per link of vehicles released uniformly
+#     during the upstream green, summed over links and both directions.
+# Per cycle, the arrival masks and link wait tables depend on one offset or
+# one offset difference only, so any (k, n) array of candidate offset sets
+# is scored with table lookups. Delay is a sum of per-link terms and is
+# solved exactly link by link; bandwidth is enumerated exactly when there
+# are at most EXACT_LIMIT offset sets, and searched otherwise.
+CYCLE_RANGE = (60, 160)
+CYCLE_STEP = 5
+OBJECTIVES = ('bandwidth', 'delay')
+MAX_SWEEPS = 10
+RANDOM_STARTS = 256
+EXACT_LIMIT = 30000
+EXACT_BLOCK = 64
+
+def max_circular_run(mask):
+    """Length of the longest circular run of True along the last axis."""
+    n = mask.shape[-1]
+    # 1-based positions, in the smallest dtype that holds them
+    index = np.arange(1, n + 1, dtype=np.min_scalar_type(n))
+    run = (index - np.maximum.accumulate(np.where(mask, index.dtype.type(0), index), axis=-1)).max(axis=-1)
+    # A run through the end of the cycle continues from its start
+    wrap = np.argmin(mask, axis=-1) + np.argmin(mask[..., ::-1], axis=-1)
+    return np.where(mask.all(axis=-1), n, np.maximum(run, wrap))
+
+class CorridorTables:
+    """Lookup tables of one corridor at one common cycle length.
+
+    masks_out[i, offset, t] tells whether a vehicle leaving the first signal
+    at second t of the cycle meets green at signal i when that signal runs
+    the given offset; masks_in is the same from the last signal. wait_out[l, d]
+    and wait_in[l, d] are the mean red waits on link l (between signals l
+    and l+1) for an offset difference of d seconds.
+
+    BandwidthTables and DelayTables add the objective: score(offsets) per
+    row of a (k, n) offsets array, and coordinate_scores(offsets, i) for
+    every offset of signal i with the others held; lower is better in both.
+    exact_offsets(limit) returns optimal offsets and the evaluations used;
+    bandwidth is only enumerated up to `limit` offset sets, else (None, 0).
+    """
+
+    def __init__(self, cycle, green, travel_out, travel_in):
+        self.cycle = cycle
+        self.green = green
+        self.size = len(green)
+        t = np.arange(cycle)
+        offsets = np.arange(cycle)
+
+        # Seconds from the first (outbound) or last (inbound) signal to each signal
+        self.arrive_out = np.round(np.concatenate([[0], np.cumsum(travel_out)])).astype(int)
+        self.arrive_in = np.round(np.concatenate([np.cumsum(travel_in[::-1])[::-1], [0]])).astype(int)
+        self.masks_out = self._masks(self.arrive_out, t, offsets)
+        self.masks_in = self._masks(self.arrive_in, t, offsets)
+
+        self.wait_out = np.array([self._link_wait(green[l], green[l + 1], travel_out[l], offsets)
+                                  for l in range(self.size - 1)]).reshape(-1, cycle)
+        # Inbound, vehicles leave signal l+1 and the difference is taken the other way
+        self.wait_in = np.array([self._link_wait(green[l + 1], green[l], travel_in[l], offsets)
+                                 for l in range(self.size - 1)]).reshape(-1, cycle)
+
+    def _masks(self, arrivals, t, offsets):
+        phase = (t[None, None, :] + arrivals[:, None, None] - offsets[None, :, None]) % self.cycle
+        return phase < self.green[:, None, None]
+
+    def _link_wait(self, green_up, green_down, travel, differences):
+        # Departures at every second of the upstream green
+        phase = (np.arange(green_up)[None, :] + round(travel) - differences[:, None]) % self.cycle
+        return np.where(phase < green_down, 0, self.cycle - phase).mean(axis=1)
+
+    def shift_scores(self, offsets, i):
+        """Scores of moving signals i.. together by every shift of 0..cycle-1 seconds."""
+        candidates = np.tile(offsets, (self.cycle, 1))
+        candidates[:, i:] = (offsets[i:] + np.arange(self.cycle)[:, None]) % self.cycle
+        return self.score(candidates)
+
+    def bandwidth(self, offsets):
+        """Outbound and inbound bandwidth (s) of every row of a (k, n) offsets array."""
+        signals = np.arange(self.size)
+        out = self.masks_out[signals, offsets].all(axis=1)
+        inbound = self.masks_in[signals, offsets].all(axis=1)
+        return max_circular_run(out), max_circular_run(inbound)
+
+    def delay(self, offsets):
+        """Outbound and inbound link delay (s), summed over links, per row of offsets."""
+        if self.size < 2:
+            zero = np.zeros(len(offsets))
+            return zero, zero
+        links = np.arange(self.size - 1)
+        difference = (offsets[:, 1:] - offsets[:, :-1]) % self.cycle
+        out = self.wait_out[links, difference].sum(axis=1)
+        inbound = self.wait_in[links, (-difference) % self.cycle].sum(axis=1)
+        return out, inbound
+
+class BandwidthTables(CorridorTables):
+    def score(self, offsets):
+        out, inbound = self.bandwidth(offsets)
+        return -(out + inbound).astype(float)
+
+    def coordinate_scores(self, offsets, i):
+        others = np.delete(np.arange(self.size), i)
+        out = self.masks_out[others, offsets[others]].all(axis=0) & self.masks_out[i]
+        inbound = self.masks_in[others, offsets[others]].all(axis=0) & self.masks_in[i]
+        return -(max_circular_run(out) + max_circular_run(inbound)).astype(float)
+
+    def shift_scores(self, offsets, i):
+        # Moving signals i.. by d seconds rolls their joint green mask by d
+        t = np.arange(self.cycle)
+        rolled = (t[None, :] - t[:, None]) % self.cycle
+        head, tail = np.arange(i), np.arange(i, self.size)
+        out = self.masks_out[head, offsets[head]].all(axis=0) & \
+            self.masks_out[tail, offsets[tail]].all(axis=0)[rolled]
+        inbound = self.masks_in[head, offsets[head]].all(axis=0) & \
+            self.masks_in[tail, offsets[tail]].all(axis=0)[rolled]
+        return -(max_circular_run(out) + max_circular_run(inbound)).astype(float)
+
+    def exact_offsets(self, limit=EXACT_LIMIT):
+        count = self.cycle ** (self.size - 1)
+        if count > limit:
+            return None, 0
+        if self.size == 1:
+            return np.zeros(1, dtype=int), 1
+        # Every offset set with the first signal at 0: blocks of the middle
+        # signals' offsets, each against every offset of the last signal
+        places = self.cycle ** np.arange(self.size - 3, -1, -1)
+        signals = np.arange(self.size - 1)
+        best, best_score = None, np.inf
+        for start in range(0, count // self.cycle, EXACT_BLOCK):
+            index = np.arange(start, min(count // self.cycle, start + EXACT_BLOCK))
+            offsets = np.zeros((len(index), self.size), dtype=int)
+            offsets[:, 1:-1] = index[:, None] // places % self.cycle
+            out = self.masks_out[signals, offsets[:, :-1]].all(axis=1)[:, None, :] & self.masks_out[-1]
+            inbound = self.masks_in[signals, offsets[:, :-1]].all(axis=1)[:, None, :] & self.masks_in[-1]
+            scores = -(max_circular_run(out) + max_circular_run(inbound))
+            k, last = np.unravel_index(np.argmin(scores), scores.shape)
+            if scores[k, last] < best_score:
+                best, best_score = offsets[k].copy(), scores[k, last]
+                best[-1] = last
+        return best, count
+
+class DelayTables(CorridorTables):
+    def score(self, offsets):
+        out, inbound = self.delay(offsets)
+        return out + inbound
+
+    def exact_offsets(self, limit=EXACT_LIMIT):
+        # Each link's delay depends on its own offset difference only, and
+        # any set of differences is reachable, so every link takes its best
+        differences = np.arange(self.cycle)
+        link_delay = self.wait_out[:, differences] + self.wait_in[:, -differences % self.cycle]
+        best = np.argmin(link_delay, axis=1)
+        return np.concatenate([[0], np.cumsum(best)]).astype(int) % self.cycle, link_delay.size
+
+    def coordinate_scores(self, offsets, i):
+        candidates = np.arange(self.cycle)
+        total = np.zeros(self.cycle)
+        if i > 0:
+            difference = (candidates - offsets[i - 1]) % self.cycle
+            total += self.wait_out[i - 1, difference] + self.wait_in[i - 1, -difference % self.cycle]
+        if i < self.size - 1:
+            difference = (offsets[i + 1] - candidates) % self.cycle
+            total += self.wait_out[i, difference] + self.wait_in[i, -difference % self.cycle]
+        return total
+
+def _coordinate_search(tables, offsets, max_sweeps):
+    """Move one offset, or all offsets from one signal on, to its best value
+    until a sweep changes nothing."""
+    offsets = offsets.copy()
+    evaluations = 0
+    for _ in range(max_sweeps):
+        changed = False
+        # The first signal is the reference and keeps offset 0
+        for i in range(1, tables.size):
+            scores = tables.coordinate_scores(offsets, i)
+            evaluations += len(scores)
+            best = int(np.argmin(scores))
+            if scores[best] < scores[offsets[i]]:
+                offsets[i] = best
+                changed = True
+
+            # Shifting signals i.. together changes only the link into signal i
+            scores = tables.shift_scores(offsets, i)
+            evaluations += len(scores)
+            best = int(np.argmin(scores))
+            if scores[best] < scores[0]:
+                offsets[i:] = (offsets[i:] + best) % tables.cycle
+                changed = True
+        if not changed:
+            break
+    return offsets, evaluations
+
+def optimize_offsets(tables, rng, starts=4, max_sweeps=MAX_SWEEPS, random_starts=RANDOM_STARTS,
+                     exact_limit=EXACT_LIMIT):
+    """Offsets at one cycle length: exact when the tables allow it within
+    `exact_limit` evaluations, else a local search from the ideal one-way
+    progressions and the best `starts` of `random_starts` random offset sets."""
+    offsets, evaluations = tables.exact_offsets(exact_limit)
+    if offsets is not None:
+        return offsets, evaluations
+
+    cycle, size = tables.cycle, tables.size
+    candidates = np.vstack([
+        tables.arrive_out % cycle,
+        (tables.arrive_in[0] - tables.arrive_in) % cycle,
+        rng.integers(0, cycle, size=(random_starts, size))
+    ]).astype(int)
+    candidates[:, 0] = 0
+    scores = tables.score(candidates)
+    evaluations = len(candidates)
+
+    best_offsets, best_score = None, np.inf
+    for start in np.argsort(scores, kind='stable')[:starts]:
+        offsets, used = _coordinate_search(tables, candidates[start], max_sweeps)
+        evaluations += used
+        score = tables.score(offsets[None, :])[0]
+        evaluations += 1
+        if score < best_score:
+            best_offsets, best_score = offsets, score
+    return best_offsets, evaluations
+
+def green_ratios(intersections):
+    ratios = []
+    for k, intersection in enumerate(intersections):
+        if not isinstance(intersection, dict):
+            raise ValueError("Each intersection must be an object")
+        try:
+            if 'green_ratio' in intersection:
+                ratio = float(intersection['green_ratio'])
+            elif 'green' in intersection and 'cycle' in intersection:
+                ratio = float(intersection['green']) / float(intersection['cycle'])
+            else:
+                ratio = 0.5
+        except (TypeError, ValueError, ZeroDivisionError):
+            raise ValueError(f"Intersection {k}: green_ratio, green and cycle must be numeric") from None
+        if not 0 < ratio < 1:
+            raise ValueError(f"Intersection {k}: the arterial green ratio must be between 0 and 1")
+        ratios.append(ratio)
+    return np.array(ratios)
+
+def optimize_corridor(intersections, travel_times, inbound_travel_times=None, objective='bandwidth',
+                      cycle_range=CYCLE_RANGE, cycle_step=CYCLE_STEP, seed=None):
+    """Common cycle length and per-signal offsets for an ordered corridor.
+
+    intersections are objects with an optional `intersection_id` and either
+    a `green_ratio` (arterial green / cycle) or a `green` and `cycle` from
+    their current plan; travel_times[l] is the link time in seconds from
+    signal l to l+1, and inbound_travel_times the reverse (the same by
+    default). Every cycle in cycle_range is tried in cycle_step steps;
+    'bandwidth' picks the one with the highest two-way bandwidth per second
+    of cycle, 'delay' the one with the lowest total link delay.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"objective must be one of {', '.join(OBJECTIVES)}")
+    if not intersections:
+        raise ValueError("At least one intersection is required")
+    ratios = green_ratios(intersections)
+    try:
+        travel_out = np.asarray(travel_times, dtype=float).reshape(-1)
+        travel_in = travel_out if inbound_travel_times is None else \
+            np.asarray(inbound_travel_times, dtype=float).reshape(-1)
+        low, high = (int(c) for c in cycle_range)
+        step = int(cycle_step)
+    except (TypeError, ValueError):
+        raise ValueError("travel_times, cycle range and step must be numeric") from None
+    if len(travel_out) != len(ratios) - 1 or len(travel_in) != len(ratios) - 1:
+        raise ValueError("travel_times needs one entry per link (one fewer than intersections)")
+    if not (np.isfinite(travel_out).all() and np.isfinite(travel_in).all()) or \
+            (travel_out < 0).any() or (travel_in < 0).any():
+        raise ValueError("travel_times must be non-negative numbers")
+    if not 10 <= low <= high or step <= 0:
+        raise ValueError("cycle range must satisfy 10 <= cycle_min <= cycle_max and cycle_step > 0")
+
+    started = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    Tables = BandwidthTables if objective == 'bandwidth' else DelayTables
+    best, evaluations = None, 0
+    for cycle in range(low, high + 1, step):
+        green = np.maximum(1, np.round(ratios * cycle)).astype(int)
+        tables = Tables(cycle, green, travel_out, travel_in)
+        offsets, used = optimize_offsets(tables, rng)
+        evaluations += used
+        score = tables.score(offsets[None, :])[0]
+        # Bandwidth is compared per second of cycle, delay as is
+        rank = score / cycle if objective == 'bandwidth' else score
+        if best is None or rank < best[0]:
+            best = (rank, tables, offsets)
+
+    _, tables, offsets = best
+    bandwidth_out, bandwidth_in = (int(b[0]) for b in tables.bandwidth(offsets[None, :]))
+    delay_out, delay_in = (float(d[0]) for d in tables.delay(offsets[None, :]))
+    cycle = tables.cycle
+    return {
+        "objective": objective,
+        "cycle_length": cycle,
+        "bandwidth_outbound": bandwidth_out,
+        "bandwidth_inbound": bandwidth_in,
+        "bandwidth_efficiency": round((bandwidth_out + bandwidth_in) / (2 * cycle), 3),
+        "delay_outbound": round(delay_out, 2),
+        "delay_inbound": round(delay_in, 2),
+        "intersections": [
+            {
+                "intersection_id": intersection.get('intersection_id', k),
+                "offset": int(offset),
+                "green": int(green),
+                "red": int(cycle - green)
+            }
+            for k, (intersection, offset, green) in enumerate(zip(intersections, offsets, tables.green))
+        ],
+        "offsets_evaluated": evaluations,
+        "elapsed_s": round(time.perf_counter() - started, 3)
+    }
@@ -0,0 +1,59 @@
+import numpy as np
+
+# HCM uniform + incremental control delay per approach, with queues from
+# Little's law. Every function broadcasts, so a whole swarm of plans over
+# every hour is scored in one call.
+SATURATION_FLOW = 1800.0  # veh/h of green, one lane per approach
+ANALYSIS_PERIOD = 0.25  # h, period for the incremental (random + overflow) term
+
+def control_delay(flow, green, cycle, saturation_flow=SATURATION_FLOW, period=ANALYSIS_PERIOD):
+    """Average control delay (s/veh) of each approach.
+
+    flow is in veh/h, green and cycle in seconds. Oversaturated approaches
+    (flow above capacity) stay finite through the incremental term;
+    approaches without green get infinite delay.
+    """
+    flow = np.asarray(flow, dtype=float)
+    green = np.asarray(green, dtype=float)
+    cycle = np.asarray(cycle, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        green_ratio = green / cycle
+        capacity = saturation_flow * green_ratio
+        x = flow / capacity
+        uniform = 0.5 * cycle * (1 - green_ratio) ** 2 / (1 - np.minimum(1, x) * green_ratio)
+        incremental = 900 * period * ((x - 1) + np.sqrt((x - 1) ** 2 + 4 * x / (capacity * period)))
+        delay = uniform + np.where(flow > 0, incremental, 0)
+    return np.where(green > 0, delay, np.inf)
+
+def intersection_delay(flow, green, cycle, **kwargs):
+    """Flow-weighted average delay (s/veh) and total average queue (veh).
+
+    The last axis of flow and green holds the approaches. cycle broadcasts
+    against green: a scalar, one value per plan with a trailing axis of 1,
+    or one cycle per approach.
+    """
+    flow = np.asarray(flow, dtype=float)
+    delay = control_delay(flow, green, cycle, **kwargs)
+    # Approaches without traffic add nothing, even when they get no green
+    weighted = np.where(flow > 0, flow * delay, 0)
+    total_flow = flow.sum(axis=-1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        average = np.where(total_flow > 0, weighted.sum(axis=-1) / total_flow, 0)
+    queue = weighted.sum(axis=-1) / 3600
+    return average, queue
+
+def timings_from_columns(df, signal_count):
+    """Green times and per-approach cycles from "G:x|R:y" Signal_i_Timings columns.
+
+    Returns None when the columns are missing; unparseable cells become NaN.
+    """
+    columns = [f'Signal_{j+1}_Timings' for j in range(signal_count)]
+    if not all(c in df.columns for c in columns):
+        return None
+    green = np.empty((len(df), signal_count))
+    cycle = np.empty((len(df), signal_count))
+    for j, column in enumerate(columns):
+        parts = df[column].astype(str).str.extract(r'G:\s*([\d.]+)\s*\|\s*R:\s*([\d.]+)').astype(float)
+        green[:, j] = parts[0].to_numpy()
+        cycle[:, j] = parts[0].to_numpy() + parts[1].to_numpy()
+    return green, cycle
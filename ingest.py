@@ -0,0 +1,189 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+# Uploads are parsed CHUNK_ROWS rows at a time with compact dtypes, and
+# optionally folded into hourly rows as they stream in: consecutive rows of
+# one intersection that share a Day and Hour (e.g. twelve 5-minute readings)
+# become a single row with summed vehicle counts and averaged Avg_* metrics.
+CHUNK_ROWS = 50_000
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Metrics are averaged at the precision they are reported with
+METRIC_DECIMALS = 2
+
+COUNT_COLUMN = re.compile(r'^(Total_Vehicles|Signal_\d+_Vehicles)$')
+METRIC_COLUMN = re.compile(r'^Avg_')
+KEY_COLUMNS = ['Intersection_ID', 'Day', 'Hour']
+
+# Keys of the per-hour means the live_traffic engine works from
+MEAN_KEYS = ['Intersection_ID', 'Intersection_Type', 'Day', 'Hour']
+
+def csv_dtypes(max_signals=16):
+    """Parse-time dtypes for the known columns (read_csv ignores absent ones).
+
+    Counts, hours and metrics are parsed as float32 so missing cells stay
+    NaN; compact() narrows complete count and hour columns to integers.
+    """
+    dtypes = {'Day': 'category', 'Hour': np.float32, 'Total_Vehicles': np.float32,
+              'Avg_Queue_Length': np.float32, 'Avg_Delay_Time': np.float32}
+    for j in range(max_signals):
+        dtypes[f'Signal_{j+1}_Vehicles'] = np.float32
+    return dtypes
+
+def read_csv_chunks(source, chunksize=CHUNK_ROWS):
+    reader = pd.read_csv(source, chunksize=chunksize, dtype=csv_dtypes())
+    for chunk in reader:
+        chunk.columns = [c.strip().replace(" ", "_") for c in chunk.columns]
+        yield chunk
+
+def arrow_chunks(batches):
+    for batch in batches:
+        yield batch.to_pandas()
+
+def _fold_runs(part, summed):
+    # Rows are partial hours: counts, metric sums and metric counts
+    # (non-missing readings) add up; any other column keeps its first value
+    keys = [c for c in KEY_COLUMNS if c in part.columns]
+    if 'Intersection_ID' in part.columns:
+        order = np.argsort(pd.factorize(part['Intersection_ID'])[0], kind='stable')
+        part = part.iloc[order].reset_index(drop=True)
+    start = np.zeros(len(part), dtype=bool)
+    start[:1] = True
+    for key in keys:
+        values = part[key].astype(object).to_numpy()
+        start[1:] |= values[1:] != values[:-1]
+    run = np.cumsum(start) - 1
+
+    grouped = part.groupby(run, sort=False)
+    folded = grouped[summed].sum(min_count=1)
+    others = [c for c in part.columns if c not in summed]
+    if others:
+        folded = pd.concat([grouped[others].first(), folded], axis=1)[part.columns]
+    return folded.reset_index(drop=True)
+
+def _partials(chunk, metric_columns):
+    chunk = chunk.copy()
+    chunk['Day'] = chunk['Day'].astype(object)
+    for column in metric_columns:
+        values = chunk.pop(column)
+        chunk[f'{column}_sum'] = values.astype(float)
+        chunk[f'{column}_n'] = values.notna().astype(np.int32)
+    return chunk
+
+def hourly(chunks):
+    """Fold chunks into one row per intersection and hour, keeping row order.
+
+    Without Day and Hour columns the chunks are only concatenated. Rows of
+    several intersections come out grouped by intersection, in order of
+    first appearance.
+    """
+    done = []
+    pending = None
+    metric_columns = summed = None
+    for chunk in chunks:
+        if not {'Day', 'Hour'} <= set(chunk.columns):
+            done.append(chunk)
+            continue
+        if summed is None:
+            columns = list(chunk.columns)
+            metric_columns = [c for c in chunk.columns if METRIC_COLUMN.match(c)]
+            summed = [c for c in chunk.columns if COUNT_COLUMN.match(c)]
+            summed += [f'{c}_{part}' for c in metric_columns for part in ('sum', 'n')]
+        part = _partials(chunk, metric_columns)
+        if pending is not None:
+            part = pd.concat([pending, part], ignore_index=True)
+        part = _fold_runs(part, summed)
+
+        # The last hour of each intersection may continue in the next chunk
+        if 'Intersection_ID' in part.columns:
+            last = ~part['Intersection_ID'].duplicated(keep='last').to_numpy()
+        else:
+            last = np.arange(len(part)) == len(part) - 1
+        done.append(part[~last])
+        pending = part[last]
+    if pending is not None:
+        done.append(pending)
+    if not done:
+        return pd.DataFrame()
+
+    df = pd.concat(done, ignore_index=True)
+    if metric_columns is not None:
+        for column in metric_columns:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = df.pop(f'{column}_sum').to_numpy() / df.pop(f'{column}_n').to_numpy()
+            df[column] = np.round(mean, METRIC_DECIMALS)
+        # Back in the upload's column order
+        df = df[[c for c in columns if c in df.columns] + [c for c in df.columns if c not in columns]]
+        if 'Intersection_ID' in df.columns:
+            df = df.iloc[np.argsort(pd.factorize(df['Intersection_ID'])[0], kind='stable')]
+    return compact(df.reset_index(drop=True))
+
+def hourly_means(chunks):
+    """Mean vehicle counts per intersection, Day and Hour, folded chunk by chunk.
+
+    Groups on the MEAN_KEYS present; each chunk is reduced to sums and
+    non-missing counts per key and added to the running totals, so memory
+    depends on the number of intersection-hours rather than on the rows
+    uploaded. Other columns are dropped. Without an Hour column the chunks
+    are only concatenated.
+    """
+    totals = None
+    passthrough = []
+    for chunk in chunks:
+        if 'Hour' not in chunk.columns:
+            passthrough.append(chunk)
+            continue
+        keys = [c for c in MEAN_KEYS if c in chunk.columns]
+        counts = [c for c in chunk.columns if COUNT_COLUMN.match(c)]
+        values = chunk[counts].astype(float)
+        part = pd.concat([values, values.notna().astype(np.int64).add_suffix('_n')], axis=1)
+        for key in keys:
+            part[key] = chunk[key].astype(object) if key != 'Hour' else chunk[key]
+        part = part.groupby(keys, sort=False, dropna=False).sum()
+        if totals is not None:
+            part = pd.concat([totals, part]).groupby(level=keys, sort=False, dropna=False).sum()
+        totals = part
+    if totals is None:
+        return concat_compact(passthrough)
+
+    counts = [c for c in totals.columns if not c.endswith('_n')]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = totals[counts].to_numpy() / totals[[f'{c}_n' for c in counts]].to_numpy()
+    df = pd.DataFrame(means, columns=counts, index=totals.index).reset_index()
+    df['Hour'] = _compact_hour(df['Hour'])
+    return pd.concat([df] + passthrough, ignore_index=True) if passthrough else df
+
+def _compact_hour(values):
+    if not (pd.api.types.is_numeric_dtype(values) and values.notna().all()):
+        return values
+    return values.astype(np.int8) if values.between(-128, 127).all() else values.astype(np.int32)
+
+def compact(df):
+    """Categorical Day, int8 Hour and int32 vehicle counts.
+
+    Counts or hours with missing values stay float32.
+    """
+    df = df.copy()
+    for column in df.columns:
+        values = df[column]
+        if column == 'Day':
+            days = values.dropna().astype(str).unique()
+            categories = DAYS if set(days) <= set(DAYS) else sorted(days)
+            df[column] = pd.Categorical(values.astype(object), categories=categories)
+        elif column == 'Hour':
+            df[column] = _compact_hour(values)
+        elif COUNT_COLUMN.match(column) and pd.api.types.is_numeric_dtype(values):
+            if values.notna().all() and (values % 1 == 0).all() and values.abs().max() < 2**31:
+                df[column] = values.astype(np.int32)
+            else:
+                df[column] = values.astype(np.float32)
+    return df
+
+def read_hourly_csv(source, chunksize=CHUNK_ROWS):
+    return hourly(read_csv_chunks(source, chunksize))
+
+def concat_compact(chunks):
+    chunks = list(chunks)
+    return compact(pd.concat(chunks, ignore_index=True)) if chunks else pd.DataFrame()
@@ -1,210 +1,313 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify
 from flask_cors import CORS
 import numpy as np
 import pandas as pd
 import os
+import math
 import tempfile
 from datetime import datetime
+from streaming import STREAM_FORMATS, stream_rows
+from table_io import read_upload, request_fields, result_format, write_table
+from metrics import Metrics, instrument
+from delay_model import intersection_delay
+from ingest import hourly_means
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for cross-origin requests
 
+# Stage timers and request latencies, served on GET /metrics
+METRICS = Metrics('live_traffic')
+
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Dataset optimizer lookup tables, indexed by time type:
+# [heavy-traffic peak, peak, night, regular]
+CYCLE_TIMES = {
+    "Four-Way": [180, 160, 100, 140],
+    "Diamond": [180, 160, 100, 140],
+    "Roundabout": [160, 130, 80, 110]
+}
+DEFAULT_CYCLE_TIMES = [150, 120, 80, 100]  # T-Junction
+
+# Mumbai-specific weight overrides for [heavy-traffic peak, peak, night];
+# other time types and intersection types use the adaptive weights
+TIME_ADJUSTED_WEIGHTS = {
+    "Four-Way": [[0.32, 0.32, 0.18, 0.18], [0.3, 0.3, 0.2, 0.2], [0.26, 0.26, 0.24, 0.24]],
+    "T-Junction": [[0.45, 0.45, 0.1], [0.42, 0.42, 0.16], [0.36, 0.36, 0.28]]
+}
+
+# Live-tick lookup tables
+BASE_DENSITY = {"red": 60, "yellow": 40, "green": 10}
+REQUIRED_SIGNALS = {"Four-Way": 4, "T-Junction": 3, "Diamond": 4, "Roundabout": 4}
+# More conservative delay factors
+DELAY_FACTORS = {"Four-Way": 0.6, "T-Junction": 0.5, "Diamond": 0.55, "Roundabout": 0.45}
+
+def _distance_km(distance):
+    # "10 km", "1,000 m" or a bare number (km); NaN when it does not parse
+    try:
+        text = distance.lower().replace(',', '').replace(' ', '')
+        if 'km' in text:
+            return float(text.replace('km', ''))
+        if 'm' in text:
+            return float(text.replace('m', '')) / 1000
+        return float(text)
+    except (AttributeError, ValueError):
+        return np.nan
+
+def parse_distances_km(distances):
+    return np.array([_distance_km(d) for d in distances], dtype=float)
+
+def color_to_vehicle_counts(colors, current_hours, current_travel_times, current_distances):
+    """Array version of color_to_vehicle_count for many junctions at once"""
+    hours = np.asarray(current_hours, dtype=float)
+    travel_times = np.asarray(current_travel_times, dtype=float)
+
+    # Base traffic density based on color, adjusted for peak hours and late night/early morning
+    density = np.array([BASE_DENSITY.get(c.lower(), 40) if isinstance(c, str) else 40 for c in colors], dtype=float)
+    peak = ((7 <= hours) & (hours <= 10)) | ((16 <= hours) & (hours <= 19))
+    night = (22 <= hours) | (hours <= 5)
+    density = density * np.select([peak, night], [1.3, 0.7], 1.0)
+
+    # Speed (km/h) from travel time and distance; heavy congestion below
+    # 20 km/h, moderate below 40. Unparseable inputs get no adjustment.
+    distance_km = parse_distances_km(current_distances)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        speed = np.where(travel_times != 0, distance_km / (travel_times / 3600), np.nan)
+    density = density * np.select([speed < 20, speed < 40], [1.4, 1.2], 1.0)
+
+    return np.minimum(100, np.maximum(5, density))  # Keep within reasonable bounds
+
 def color_to_vehicle_count(color, current_hour, current_travel_time, current_distance):
-    # Base traffic density based on color
-    base_density = {"red": 60, "yellow": 40, "green": 10}.get(color.lower(), 40)
-    
-    # Adjust based on time of day
+    density = BASE_DENSITY.get(color.lower(), 40) if isinstance(color, str) else 40
     if 7 <= current_hour <= 10 or 16 <= current_hour <= 19:  # Peak hours
-        base_density *= 1.3
+        density *= 1.3
     elif 22 <= current_hour or current_hour <= 5:  # Late night/early morning
-        base_density *= 0.7
-    
-    # Adjust based on travel time and distance
-    try:
-        # Try to parse distance (could be "10 km" or "1,000 m")
-        distance_str = current_distance.lower().replace(',', '').replace(' ', '')
-        if 'km' in distance_str:
-            distance_km = float(distance_str.replace('km', ''))
-        elif 'm' in distance_str:
-            distance_km = float(distance_str.replace('m', '')) / 1000
-        else:
-            distance_km = float(distance_str)  # assume km
-        
-        # Calculate speed (km/h)
-        speed = distance_km / (current_travel_time / 3600)
-        
-        # Adjust density based on speed
+        density *= 0.7
+
+    if current_travel_time:
+        speed = _distance_km(current_distance) / (current_travel_time / 3600)
         if speed < 20:  # Heavy congestion
-            base_density *= 1.4
+            density *= 1.4
         elif speed < 40:  # Moderate congestion
-            base_density *= 1.2
-        # else: light traffic, no adjustment
-        
-        return min(100, max(5, base_density))  # Keep within reasonable bounds
-    except:
-        return min(100, max(5, base_density))  # Fallback if parsing fails
-
-def calculate_optimized_timings(color, given_green_times, given_red_times, intersection_type, 
-                              current_hour, current_travel_time, current_distance):
-    vehicle_count = color_to_vehicle_count(color, current_hour, current_travel_time, current_distance)
+            density *= 1.2
+    return min(100, max(5, density))
+
+def _parse_observation(observation, default_hour):
+    """Validate one live-tick observation; raises ValueError with the client-facing message"""
+    if not isinstance(observation, dict):
+        raise ValueError("Each observation must be an object")
+
+    color = observation.get('color')
+    given_green_times = observation.get('green_times')
+    given_red_times = observation.get('red_times')
+    if not color or not given_green_times or not given_red_times:
+        raise ValueError("Missing required parameters")
+    if not isinstance(color, str):
+        raise ValueError("color must be a string")
+
+    intersection_type = observation.get('intersection_type', 'Four-Way')
     num_signals = len(given_green_times)
 
     # Validate number of signals based on intersection type
-    if intersection_type == "Four-Way" and num_signals != 4:
-        raise ValueError("Four-Way intersection requires exactly 4 signal timings")
-    elif intersection_type == "T-Junction" and num_signals != 3:
-        raise ValueError("T-Junction requires exactly 3 signal timings")
-    elif intersection_type in ["Diamond", "Roundabout"] and num_signals != 4:
-        raise ValueError(f"{intersection_type} requires exactly 4 signal timings")
-
-    # Mumbai-specific cycle times based on intersection type
-    base_cycle_time = {
-        "Four-Way": 160,  # Typical Mumbai 4-way intersection cycle: 120-180 seconds
-        "T-Junction": 120,
-        "Diamond": 150,
-        "Roundabout": 130
-    }.get(intersection_type, 160)
-    
-    # Calculate average of current green and red times
-    avg_green_time = sum(given_green_times) / len(given_green_times)
-    avg_red_time = sum(given_red_times) / len(given_red_times)
-    
-    # Keep optimizations within realistic bounds - start with current values
-    optimized_green_times = given_green_times.copy()
-    optimized_red_times = given_red_times.copy()
-    
-    # Adjustment factors - smaller for more subtle optimization
-    green_adjustment_factor = 0.15  # Max 15% change
-    red_adjustment_factor = 0.12    # Max 12% change
-    
-    # Adjust for peak hours with Mumbai traffic patterns
-    is_peak_hour = (8 <= current_hour <= 11) or (18 <= current_hour <= 21)  # Updated peak hour definition
-    
-    # Calculate weights based on intersection type and traffic conditions
-    if intersection_type == "T-Junction":
-        # For T-Junction, give more weight to the main road (first two directions)
-        weights = [0.4, 0.4, 0.2]
-    elif intersection_type == "Four-Way":
-        if is_peak_hour:
-            # During peak hours, favor main roads slightly more in Mumbai traffic
-            weights = [0.3, 0.3, 0.2, 0.2]
+    required = REQUIRED_SIGNALS.get(intersection_type)
+    if required is not None and num_signals != required:
+        name = "Four-Way intersection" if intersection_type == "Four-Way" else intersection_type
+        raise ValueError(f"{name} requires exactly {required} signal timings")
+    if len(given_red_times) != num_signals:
+        raise ValueError("green_times and red_times must have the same length")
+
+    try:
+        green = [float(t) for t in given_green_times]
+        red = [float(t) for t in given_red_times]
+        current_hour = float(observation.get('current_hour', default_hour))
+        current_travel_time = float(observation.get('current_travel_time', 0))
+    except (TypeError, ValueError):
+        raise ValueError("Timings, current_hour and current_travel_time must be numeric") from None
+    if not all(map(math.isfinite, green + red)):
+        raise ValueError("Timings must be finite numbers")
+
+    return (color.lower(), green, red, intersection_type, current_hour,
+            current_travel_time, observation.get('current_distance', '0 km'))
+
+def _optimize_timing_arrays(colors, green, red, hours):
+    """Optimized green/red times for a block of junctions sharing one signal count"""
+    num_signals = green.shape[1]
+    main_direction = np.arange(num_signals) < 2  # Main directions get more green time
+
+    # Peak hours follow the Mumbai pattern (8-11 AM, 6-9 PM)
+    is_peak_hour = ((8 <= hours) & (hours <= 11)) | ((18 <= hours) & (hours <= 21))
+    is_heavy_traffic_peak = (is_peak_hour & (colors == "red"))[:, None]
+    congested = ((colors == "red") | ((colors == "yellow") & is_peak_hour))[:, None]
+    light = (colors == "green")[:, None]
+
+    # Heavy traffic during peak hours: greens in the 45-60 sec range
+    heavy_green = np.where(main_direction,
+                           np.minimum(60, np.maximum(45, green + 10)),
+                           np.minimum(55, np.maximum(45, green + 5)))
+    # Congested traffic: lengthen main directions (max 15%, capped at 60 sec), shorten the others
+    congested_green = np.where(main_direction,
+                               np.minimum(60, green + np.minimum(7, green * 0.15)),
+                               np.maximum(25, green - np.minimum(5, green * 0.15 * 0.8)))
+    # Light traffic: slightly reduce cycle time overall
+    light_green = np.maximum(25, green - np.minimum(5, green * 0.15 * 0.7))
+    # Yellow in normal hours: small balancing adjustments
+    balanced_green = np.where(main_direction,
+                              np.minimum(50, green + np.minimum(4, green * 0.15 * 0.6)),
+                              np.maximum(25, green))
+    optimized_green = np.round(np.select(
+        [is_heavy_traffic_peak, congested, light],
+        [heavy_green, congested_green, light_green],
+        balanced_green))
+
+    # Red times: the other directions' greens plus clearance, 75-120 sec for
+    # heavy peak traffic and the Mumbai typical 90-140 sec otherwise
+    other_greens = optimized_green.sum(axis=1, keepdims=True) - optimized_green
+    optimized_red = np.round(np.where(is_heavy_traffic_peak,
+                                      np.minimum(120, np.maximum(75, other_greens + num_signals * 1.5)),
+                                      np.minimum(140, np.maximum(90, other_greens + num_signals * 2))))
+    return optimized_green, optimized_red
+
+def _optimize_timings(color, green, red, hour):
+    """_optimize_timing_arrays for a single junction, in plain Python"""
+    num_signals = len(green)
+    is_peak_hour = 8 <= hour <= 11 or 18 <= hour <= 21
+    if is_peak_hour and color == "red":
+        optimized_green = [round(min(60, max(45, g + 10)) if i < 2 else min(55, max(45, g + 5)))
+                           for i, g in enumerate(green)]
+        total = sum(optimized_green)
+        return optimized_green, [round(min(120, max(75, total - g + num_signals * 1.5))) for g in optimized_green]
+
+    optimized_green = []
+    for i, g in enumerate(green):
+        if color == "red" or (color == "yellow" and is_peak_hour):
+            g = min(60, g + min(7, g * 0.15)) if i < 2 else max(25, g - min(5, g * 0.15 * 0.8))
+        elif color == "green":
+            g = max(25, g - min(5, g * 0.15 * 0.7))
         else:
-            weights = [0.28, 0.28, 0.22, 0.22]
-    elif intersection_type == "Roundabout":
-        # For Roundabout, more balanced approach
-        weights = [0.26, 0.26, 0.24, 0.24]
-    else:  # Diamond
-        weights = [0.25, 0.25, 0.25, 0.25]
-
-    # Apply optimization based on peak hour and traffic color
-    is_heavy_traffic_peak = is_peak_hour and color.lower() == "red"
-    
-    # Special case for heavy traffic during peak hours
-    if is_heavy_traffic_peak:
-        # Increase green times to 45-60 seconds range for peak hours with heavy traffic
-        for i in range(num_signals):
-            if i < 2:  # Main directions get more green time
-                optimized_green_times[i] = min(60, max(45, given_green_times[i] + 10))
-            else:  # Secondary directions
-                optimized_green_times[i] = min(55, max(45, given_green_times[i] + 5))
-            
-            # Round to nearest second
-            optimized_green_times[i] = round(optimized_green_times[i])
-        
-        # Calculate reduced red times for peak hours with heavy traffic (75-120 seconds)
-        for i in range(num_signals):
-            # Sum of all other directions' green times, plus reduced clearance times
-            other_greens_sum = sum(optimized_green_times) - optimized_green_times[i]
-            
-            # Calculate red time with reduced range
-            optimized_red_times[i] = other_greens_sum + (num_signals * 1.5)  # Reduced clearance
-            
-            # Ensure red times are within specified range (75-120 seconds)
-            optimized_red_times[i] = min(120, max(75, optimized_red_times[i]))
-            
-            # Round to nearest second
-            optimized_red_times[i] = round(optimized_red_times[i])
-            
-    else:
-        # Regular optimization for non-peak or non-heavy traffic conditions
-        for i in range(num_signals):
-            # Green time adjustments - typical Mumbai range: 30-45 seconds per direction
-            if color.lower() == "red" or (color.lower() == "yellow" and is_peak_hour):
-                # For congested traffic, increase green time slightly for main directions, decrease for others
-                if i < 2:  # Main directions
-                    adjustment = min(7, given_green_times[i] * green_adjustment_factor)
-                    optimized_green_times[i] = min(60, given_green_times[i] + adjustment)  # Cap at 60 seconds
-                else:
-                    adjustment = min(5, given_green_times[i] * green_adjustment_factor * 0.8)
-                    optimized_green_times[i] = max(25, given_green_times[i] - adjustment)  # Minimum 25 seconds
-            elif color.lower() == "green":
-                # For light traffic, slightly reduce cycle time overall
-                adjustment = min(5, given_green_times[i] * green_adjustment_factor * 0.7)
-                optimized_green_times[i] = max(25, given_green_times[i] - adjustment)
-            else:  # yellow normal hours
-                # Small balancing adjustments
-                if i < 2:  # Main directions
-                    adjustment = min(4, given_green_times[i] * green_adjustment_factor * 0.6)
-                    optimized_green_times[i] = min(50, given_green_times[i] + adjustment)
-                else:
-                    optimized_green_times[i] = max(25, given_green_times[i])
-            
-            # Round to nearest second
-            optimized_green_times[i] = round(optimized_green_times[i])
-        
-        # Calculate red times realistically - in Mumbai, red time per direction often 3x the green time
-        for i in range(num_signals):
-            # Sum of all other directions' green times, plus clearance times
-            other_greens_sum = sum(optimized_green_times) - optimized_green_times[i]
-            
-            # Mumbai traffic signals typically have red times around 90-135 seconds
-            # Based on cycle time minus this direction's green time, plus small clearance
-            optimized_red_times[i] = other_greens_sum + (num_signals * 2)  # Add 2 sec clearance per direction
-            
-            # Ensure red times remain in realistic range
-            optimized_red_times[i] = min(140, max(90, optimized_red_times[i]))  # Mumbai typical range
-            
-            # Round to nearest second
-            optimized_red_times[i] = round(optimized_red_times[i])
-
-    # Calculate estimated delay reduction - more conservative estimate
-    original_cycle_time = sum(given_green_times) + sum(given_red_times) / num_signals
-    optimized_cycle_time = sum(optimized_green_times) + sum(optimized_red_times) / num_signals
-    
-    # More realistic and modest delay reduction calculation with minimum values
-    delay_factor = {
-        "Four-Way": 0.6,
-        "T-Junction": 0.5,
-        "Diamond": 0.55,
-        "Roundabout": 0.45
-    }.get(intersection_type, 0.5)  # More conservative factors
-    
-    # Calculate estimated delay reduction with a minimum value of 5 seconds
-    estimated_delay_reduction = round(max(5, min(30, 
-        (max(10, vehicle_count) / 60) * 
-        max(1, abs(original_cycle_time - optimized_cycle_time)) * 
-        delay_factor
+            g = min(50, g + min(4, g * 0.15 * 0.6)) if i < 2 else max(25, g)
+        optimized_green.append(round(g))
+    total = sum(optimized_green)
+    return optimized_green, [round(min(140, max(90, total - g + num_signals * 2))) for g in optimized_green]
+
+def calculate_optimized_timings_batch(observations):
+    """Optimize one live polling tick for many junctions at once
+
+    Each observation carries the fields of the single-junction JSON request.
+    Results come back in input order; invalid observations get an
+    {"error": ...} entry in their slot instead of failing the whole tick.
+    """
+    with METRICS.timer('live_tick'):
+        results = _calculate_optimized_timings_batch(observations)
+    METRICS.inc('observations', len(observations))
+    return results
+
+def _calculate_optimized_timings_batch(observations):
+    results = [None] * len(observations)
+    parsed, positions = [], []
+    default_hour = datetime.now().hour
+    for i, observation in enumerate(observations):
+        try:
+            parsed.append(_parse_observation(observation, default_hour))
+            positions.append(i)
+        except ValueError as e:
+            results[i] = {"error": str(e)}
+    if not parsed:
+        return results
+
+    colors, greens, reds, types, hours, travel_times, distances = zip(*parsed)
+    colors = np.array(colors, dtype=object)
+    hours = np.array(hours)
+    travel_times = np.array(travel_times)
+    vehicle_counts = color_to_vehicle_counts(colors, hours, travel_times, distances)
+    delay_factors = np.array([DELAY_FACTORS.get(t, 0.5) for t in types])
+    signal_counts = np.array([len(g) for g in greens])
+
+    original_cycle_time = np.empty(len(parsed))
+    optimized_cycle_time = np.empty(len(parsed))
+    optimized_greens = [None] * len(parsed)
+    optimized_reds = [None] * len(parsed)
+    for num_signals in np.unique(signal_counts):
+        rows = np.flatnonzero(signal_counts == num_signals)
+        green = np.array([greens[r] for r in rows])
+        red = np.array([reds[r] for r in rows])
+        optimized_green, optimized_red = _optimize_timing_arrays(colors[rows], green, red, hours[rows])
+
+        original_cycle_time[rows] = green.sum(axis=1) + red.sum(axis=1) / num_signals
+        optimized_cycle_time[rows] = optimized_green.sum(axis=1) + optimized_red.sum(axis=1) / num_signals
+        for r, g, rd in zip(rows.tolist(), optimized_green.astype(int).tolist(), optimized_red.astype(int).tolist()):
+            optimized_greens[r] = g
+            optimized_reds[r] = rd
+
+    # Estimated delay reduction, at least 5 and at most 30 seconds
+    estimated_delay_reduction = np.round(np.minimum(30, np.maximum(5,
+        (np.maximum(10, vehicle_counts) / 60) *
+        np.maximum(1, np.abs(original_cycle_time - optimized_cycle_time)) *
+        delay_factors
     )))
-    
-    # Calculate estimated travel time improvement with a minimum improvement
-    # Assumption: Average Mumbai trip encounters multiple signals
-    intersections_count = max(1, round(current_travel_time / 300))  # Estimate signal count
-    efficiency_factor = 0.4  # Conservative improvement factor (40% of theoretical maximum)
-    
-    # Ensure a minimum time saved (at least 4 seconds for every minute of travel)
-    min_time_saved = max(4, round(current_travel_time * 0.067))  # At least 4% improvement
-    
-    # Calculate time saved with minimum threshold
-    time_saved = max(min_time_saved,
-                  min(current_travel_time * 0.2,
-                     estimated_delay_reduction * intersections_count * efficiency_factor))
-    
+
+    # Assumption: Average Mumbai trip encounters multiple signals; at least 4
+    # seconds saved for every minute of travel, 40% of the theoretical maximum
+    intersections_count = np.maximum(1, np.round(travel_times / 300))
+    efficiency_factor = 0.4
+    min_time_saved = np.maximum(4, np.round(travel_times * 0.067))
+    time_saved = np.maximum(min_time_saved,
+                            np.minimum(travel_times * 0.2,
+                                       estimated_delay_reduction * intersections_count * efficiency_factor))
     # Ensure optimized travel time shows improvement
-    optimized_travel_time = max(current_travel_time * 0.8, current_travel_time - time_saved)
+    optimized_travel_time = np.maximum(travel_times * 0.8, travel_times - time_saved)
+
+    columns = zip(positions, optimized_greens, optimized_reds,
+                  estimated_delay_reduction.astype(int).tolist(), types,
+                  np.round(optimized_travel_time).astype(int).tolist(),
+                  np.round(time_saved).astype(int).tolist())
+    for i, green, red, delay, intersection_type, travel_time, saved in columns:
+        results[i] = {
+            "optimized_green_times": green,
+            "optimized_red_times": red,
+            "estimated_delay_time": delay,
+            "intersection_type": intersection_type,
+            "optimized_travel_time": travel_time,
+            "time_saved": saved
+        }
+    return results
+
+def calculate_optimized_timings(color, given_green_times, given_red_times, intersection_type, 
+                              current_hour, current_travel_time, current_distance):
+    # One junction per request: the scalar formulas of the batch path, without its array overhead
+    with METRICS.timer('live_tick'):
+        result = _calculate_optimized_timings(color, given_green_times, given_red_times, intersection_type,
+                                              current_hour, current_travel_time, current_distance)
+    METRICS.inc('observations')
+    return result
+
+def _calculate_optimized_timings(color, given_green_times, given_red_times, intersection_type,
+                                 current_hour, current_travel_time, current_distance):
+    color, green, red, intersection_type, current_hour, current_travel_time, current_distance = \
+        _parse_observation({
+            "color": color, "green_times": given_green_times, "red_times": given_red_times,
+            "intersection_type": intersection_type, "current_hour": current_hour,
+            "current_travel_time": current_travel_time, "current_distance": current_distance
+        }, current_hour)
+    vehicle_count = color_to_vehicle_count(color, current_hour, current_travel_time, current_distance)
+    optimized_green, optimized_red = _optimize_timings(color, green, red, current_hour)
+
+    num_signals = len(green)
+    original_cycle_time = sum(green) + sum(red) / num_signals
+    optimized_cycle_time = sum(optimized_green) + sum(optimized_red) / num_signals
+    estimated_delay_reduction = round(min(30, max(5,
+        (max(10, vehicle_count) / 60) *
+        max(1, abs(original_cycle_time - optimized_cycle_time)) *
+        DELAY_FACTORS.get(intersection_type, 0.5)
+    )))
 
+    intersections_count = max(1, round(current_travel_time / 300))
+    min_time_saved = max(4, round(current_travel_time * 0.067))
+    time_saved = max(min_time_saved, min(current_travel_time * 0.2,
+                                         estimated_delay_reduction * intersections_count * 0.4))
+    optimized_travel_time = max(current_travel_time * 0.8, current_travel_time - time_saved)
     return {
-        "optimized_green_times": optimized_green_times,
-        "optimized_red_times": optimized_red_times,
+        "optimized_green_times": optimized_green,
+        "optimized_red_times": optimized_red,
         "estimated_delay_time": estimated_delay_reduction,
         "intersection_type": intersection_type,
         "optimized_travel_time": round(optimized_travel_time),
@@ -263,159 +366,129 @@ class TrafficSignalOptimizer:
 
     def optimize_signal_timings(self):
         """Optimize signal timings for each day and hour in the dataset"""
-        optimized_data = []
-        days = sorted(self.dataset['Day'].unique(),
-                     key=lambda x: ['Monday', 'Tuesday', 'Wednesday',
-                                  'Thursday', 'Friday', 'Saturday',
-                                  'Sunday'].index(x))
+        optimized_df = self.compute_signal_timings()
 
-        for day in days:
-            day_data = self.dataset[self.dataset['Day'] == day]
-            day_peak_hours = self.peak_hours_by_day[day]['peak']
-
-            for hour in range(24):
-                hour_data = day_data[day_data['Hour'] == hour]
-                if hour_data.empty:
-                    continue
-
-                # Check if it's peak hour and get traffic density
-                is_peak_hour = hour in day_peak_hours
-                is_night_hour = hour >= 22 or hour <= 5
-                
-                # Get traffic density for this hour
-                total_vehicles = hour_data['Total_Vehicles'].mean()
-                
-                # Determine if this is heavy traffic (red) condition
-                # Higher threshold for peak vs non-peak
-                heavy_traffic_threshold = 60 if is_peak_hour else 50
-                is_heavy_traffic = total_vehicles > heavy_traffic_threshold
-                
-                # Special case for peak hours with heavy traffic
-                is_heavy_traffic_peak = is_peak_hour and is_heavy_traffic
-                
-                # Adjust cycle time based on Mumbai traffic patterns
-                if is_heavy_traffic_peak:
-                    # Special case for peak hours with heavy traffic
-                    if self.intersection_type in ["Four-Way", "Diamond"]:
-                        cycle_time = 180  # Longer cycle for heavy peak traffic
-                    elif self.intersection_type == "Roundabout":
-                        cycle_time = 160
-                    else:  # T-Junction
-                        cycle_time = 150
-                elif is_peak_hour:
-                    if self.intersection_type in ["Four-Way", "Diamond"]:
-                        cycle_time = 160  # Mumbai peak hour cycle
-                    elif self.intersection_type == "Roundabout":
-                        cycle_time = 130
-                    else:  # T-Junction
-                        cycle_time = 120
-                elif is_night_hour:
-                    if self.intersection_type in ["Four-Way", "Diamond"]:
-                        cycle_time = 100  # Shorter cycles at night
-                    elif self.intersection_type == "Roundabout":
-                        cycle_time = 80
-                    else:  # T-Junction
-                        cycle_time = 80
-                else:
-                    if self.intersection_type in ["Four-Way", "Diamond"]:
-                        cycle_time = 140  # Regular hours
-                    elif self.intersection_type == "Roundabout":
-                        cycle_time = 110
-                    else:  # T-Junction
-                        cycle_time = 100
-
-                # Adjust weights based on time of day - Mumbai specific traffic patterns
-                time_adjusted_weights = self.adaptive_weights.copy()
-                if is_heavy_traffic_peak:
-                    # During peak hours with heavy traffic, strongly favor main roads
-                    if self.intersection_type == "Four-Way":
-                        time_adjusted_weights = [0.32, 0.32, 0.18, 0.18]
-                    elif self.intersection_type == "T-Junction":
-                        time_adjusted_weights = [0.45, 0.45, 0.1]
-                elif is_peak_hour:
-                    # During regular peak hours, favor main roads
-                    if self.intersection_type == "Four-Way":
-                        time_adjusted_weights = [0.3, 0.3, 0.2, 0.2]
-                    elif self.intersection_type == "T-Junction":
-                        time_adjusted_weights = [0.42, 0.42, 0.16]
-                elif is_night_hour:
-                    # More balanced at night
-                    if self.intersection_type == "Four-Way":
-                        time_adjusted_weights = [0.26, 0.26, 0.24, 0.24]
-                    elif self.intersection_type == "T-Junction":
-                        time_adjusted_weights = [0.36, 0.36, 0.28]
-
-                # Calculate green times
-                green_times = []
-                
-                if is_heavy_traffic_peak:
-                    # For peak hours with heavy traffic, use our special case (45-60 sec)
-                    min_green_time = 45
-                    max_green_time = 60
-                    
-                    for i, w in enumerate(time_adjusted_weights):
-                        if i < 2:  # Main directions get higher values
-                            green_time = round(min_green_time + (max_green_time - min_green_time) * w * 1.5)
-                        else:  # Secondary directions
-                            green_time = round(min_green_time + (max_green_time - min_green_time) * w)
-                        green_times.append(max(min_green_time, min(max_green_time, green_time)))
-                else:
-                    # Regular calculation
-                    min_green_time = 25 if is_night_hour else 30
-                    max_green_time = 40 if is_night_hour else (50 if is_peak_hour else 45)
-                    
-                    for w in time_adjusted_weights:
-                        green_time = round(w * (cycle_time - (len(time_adjusted_weights) * 3)))
-                        green_times.append(max(min_green_time, min(max_green_time, green_time)))
-                
-                # Calculate red times
-                red_times = []
-                
-                if is_heavy_traffic_peak:
-                    # Use reduced red times for peak hours with heavy traffic (75-120 sec)
-                    min_red_time = 75
-                    max_red_time = 120
-                    
-                    for i in range(len(time_adjusted_weights)):
-                        other_greens = sum(green_times[:i] + green_times[i+1:])
-                        red_time = other_greens + (len(time_adjusted_weights) * 1.5)  # Reduced clearance
-                        red_times.append(max(min_red_time, min(max_red_time, red_time)))
-                else:
-                    # Regular calculation - Mumbai typical range (90-135 sec)
-                    for i in range(len(time_adjusted_weights)):
-                        other_greens = sum(green_times[:i] + green_times[i+1:])
-                        red_time = other_greens + (len(time_adjusted_weights) * 2)
-                        red_times.append(max(90, min(135, red_time)))
-
-                # Calculate metrics with minimum values to ensure meaningful improvements
-                avg_queue_length = round(max(0.5, total_vehicles * np.random.uniform(0.01, 0.05)), 2)
-                avg_delay_time = round(max(2, total_vehicles * np.random.uniform(0.02, 0.06)), 2)
-
-                # Create result row
-                data_row = {
-                    "Day": day,
-                    "Hour": hour,
-                    **{f"Signal_{i+1}_Green": green for i, green in enumerate(green_times)},
-                    **{f"Signal_{i+1}_Red": red for i, red in enumerate(red_times)},
-                    "Avg_Queue_Length": avg_queue_length,
-                    "Avg_Delay_Time": avg_delay_time,
-                    "Total_Cycle_Time": sum(green_times) + sum(red_times) // len(red_times),
-                    "Traffic_Density": "Heavy" if is_heavy_traffic else "Normal",
-                    "Time_Type": "Peak" if is_peak_hour else ("Night" if is_night_hour else "Regular")
-                }
-                optimized_data.append(data_row)
-
-        # Convert to DataFrame and save
-        optimized_df = pd.DataFrame(optimized_data)
+        # Save a copy for download
         temp_dir = tempfile.gettempdir()
         output_file = os.path.join(temp_dir, f"optimized_{self.intersection_type.lower()}_signals.csv")
         optimized_df.to_csv(output_file, index=False)
 
         return optimized_df, output_file
 
+    def iter_signal_timings(self):
+        """Yield the optimized timing row for each day and hour"""
+        yield from self.compute_signal_timings().to_dict('records')
+
+    def compute_signal_timings(self, by=()):
+        """Vectorized engine: one groupby over (Day, Hour), then array lookups for every hour
+
+        Extra key columns in by (e.g. Intersection_ID) are grouped on ahead of
+        Day and Hour and lead the output columns.
+        """
+        by = list(by)
+        unknown_days = set(self.dataset['Day'].unique()) - set(DAYS)
+        if unknown_days:
+            raise ValueError(f"Unknown day {sorted(unknown_days)[0]!r}, expected one of {', '.join(DAYS)}")
+
+        data = self.dataset[self.dataset['Hour'].between(0, 23)]
+        signal_columns = [c for c in data.columns if c.startswith('Signal_') and c.endswith('_Vehicles')]
+        hourly = data.groupby(
+            by + [pd.Categorical(data['Day'], categories=DAYS), 'Hour'], observed=True, sort=True
+        )[['Total_Vehicles'] + signal_columns].mean()
+        if hourly.empty:
+            return pd.DataFrame()
+
+        day = hourly.index.get_level_values(len(by)).astype(str).to_numpy()
+        hour = hourly.index.get_level_values(len(by) + 1).to_numpy()
+        total_vehicles = hourly['Total_Vehicles'].to_numpy(dtype=float)
+
+        is_peak_hour = np.zeros(len(hour), dtype=bool)
+        for d in np.unique(day):
+            on_day = day == d
+            is_peak_hour[on_day] = np.isin(hour[on_day], self.peak_hours_by_day[d]['peak'])
+        is_night_hour = (hour >= 22) | (hour <= 5)
+        is_heavy_traffic = total_vehicles > np.where(is_peak_hour, 60, 50)
+        is_heavy_traffic_peak = is_peak_hour & is_heavy_traffic
+
+        # Row index into the per-type lookup tables
+        time_type = np.select([is_heavy_traffic_peak, is_peak_hour, is_night_hour], [0, 1, 2], 3)
+        cycle_time = np.array(CYCLE_TIMES.get(self.intersection_type, DEFAULT_CYCLE_TIMES))[time_type]
+        weight_table = TIME_ADJUSTED_WEIGHTS.get(self.intersection_type, [self.adaptive_weights] * 3)
+        weights = np.array(weight_table + [self.adaptive_weights])[time_type]
+        num_signals = weights.shape[1]
+        heavy = is_heavy_traffic_peak[:, None]
+
+        # Green times: 45-60 sec for heavy peak traffic (main directions get
+        # 1.5x the weight), otherwise a share of the cycle within day/night bounds
+        main_direction = np.arange(num_signals) < 2
+        heavy_green = np.round(45 + (60 - 45) * weights * np.where(main_direction, 1.5, 1.0))
+        heavy_green = np.maximum(45, np.minimum(60, heavy_green))
+        min_green_time = np.where(is_night_hour, 25, 30)[:, None]
+        max_green_time = np.where(is_night_hour, 40, np.where(is_peak_hour, 50, 45))[:, None]
+        regular_green = np.round(weights * (cycle_time - num_signals * 3)[:, None])
+        regular_green = np.maximum(min_green_time, np.minimum(max_green_time, regular_green))
+        green_times = np.where(heavy, heavy_green, regular_green).astype(int)
+
+        # Red times: the other directions' greens plus clearance, 75-120 sec
+        # for heavy peak traffic and 90-135 sec otherwise
+        other_greens = green_times.sum(axis=1, keepdims=True) - green_times
+        heavy_red = other_greens + num_signals * 1.5
+        regular_red = np.maximum(90, np.minimum(135, other_greens + num_signals * 2))
+        red_times = np.where(heavy, np.maximum(75, np.minimum(120, heavy_red)), regular_red)
+        # Unclamped heavy-peak red times carry the half-second clearance, so
+        # those columns stay float like the scalar implementation produced
+        fractional_red = heavy & (heavy_red > 75) & (heavy_red < 120)
+
+        # Metrics from the delay model: approach flows are the hourly mean
+        # counts, or the hour's total split by the weights without them
+        approach_columns = [f'Signal_{i+1}_Vehicles' for i in range(num_signals)]
+        if all(c in hourly.columns for c in approach_columns):
+            flows = hourly[approach_columns].to_numpy(dtype=float)
+        else:
+            flows = total_vehicles[:, None] * weights / weights.sum(axis=1, keepdims=True)
+        avg_delay_time, avg_queue_length = intersection_delay(flows, green_times, green_times + red_times)
+        avg_queue_length = np.round(avg_queue_length, 2)
+        avg_delay_time = np.round(avg_delay_time, 2)
+
+        total_cycle_time = green_times.sum(axis=1) + np.floor_divide(red_times.sum(axis=1), num_signals)
+
+        columns = {name: hourly.index.get_level_values(i).to_numpy() for i, name in enumerate(by)}
+        columns.update({"Day": day, "Hour": hour})
+        for i in range(num_signals):
+            columns[f"Signal_{i+1}_Green"] = green_times[:, i]
+        for i in range(num_signals):
+            columns[f"Signal_{i+1}_Red"] = red_times[:, i] if fractional_red[:, i].any() else red_times[:, i].astype(int)
+        columns["Avg_Queue_Length"] = avg_queue_length
+        columns["Avg_Delay_Time"] = avg_delay_time
+        columns["Total_Cycle_Time"] = total_cycle_time if fractional_red.any() else total_cycle_time.astype(int)
+        columns["Traffic_Density"] = np.where(is_heavy_traffic, "Heavy", "Normal")
+        columns["Time_Type"] = np.select([is_peak_hour, is_night_hour], ["Peak", "Night"], "Regular")
+        return pd.DataFrame(columns)
+
+def is_batch(dataset):
+    return {'Intersection_ID', 'Intersection_Type'}.issubset(dataset.columns)
+
+def optimize_batch_signal_timings(dataset, default_type='Four-Way'):
+    """Optimize a multi-intersection upload in one pass
+
+    One optimizer per Intersection_Type, each grouping its rows by
+    (Intersection_ID, Day, Hour) so every intersection of that type goes
+    through the vectorized engine together.
+    """
+    types = dataset['Intersection_Type'].fillna(default_type)
+    frames = []
+    for intersection_type, group in dataset.groupby(types, sort=False):
+        optimizer = TrafficSignalOptimizer(intersection_type, group.copy())
+        timings = optimizer.compute_signal_timings(by=['Intersection_ID'])
+        timings.insert(1, 'Intersection_Type', intersection_type)
+        frames.append(timings)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
 @app.route('/optimize', methods=['POST'])
 def optimize():
-    if request.is_json:
+    if request.is_json and 'csv_data' not in (request.get_json(silent=True) or {}):
         data = request.json
 
         if not data:
@@ -445,24 +518,59 @@ def optimize():
             return jsonify({"error": f"Optimization failed: {str(e)}"}), 500
 
     else:
+        fields = request_fields(request)
+        intersection_type = fields.get('intersection_type', 'Four-Way')
         try:
-            if 'file' not in request.files:
-                return jsonify({"error": "No file provided"}), 400
+            fmt = result_format(request, fields)
+            # The engine only uses per-hour means, so uploads are folded
+            # into them as they are read
+            with METRICS.timer('parse'):
+                dataset = read_upload(request, combine=hourly_means)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        stream_format = fields.get('stream')
+        if stream_format and stream_format not in STREAM_FORMATS:
+            return jsonify({"error": f"stream must be one of {', '.join(STREAM_FORMATS)}"}), 400
 
-            intersection_type = request.form.get('intersection_type', 'Four-Way')
-            file = request.files['file']
-            dataset = pd.read_csv(file)
+        try:
+            if is_batch(dataset):
+                download_name = "optimized_batch_signals"
+                with METRICS.timer('optimize'):
+                    optimized_timings = optimize_batch_signal_timings(dataset, default_type=intersection_type)
+                if stream_format:
+                    return stream_rows(optimized_timings.to_dict('records'), stream_format, download_name=download_name)
+                with METRICS.timer('serialize', format=fmt):
+                    return write_table(optimized_timings, fmt, download_name=download_name)
 
             optimizer = TrafficSignalOptimizer(intersection_type, dataset)
-            optimized_timings, output_file = optimizer.optimize_signal_timings()
+            download_name = f"optimized_{intersection_type.lower()}_signals"
 
-            return send_file(
-                output_file,
-                as_attachment=True,
-                download_name=f"optimized_{intersection_type.lower()}_signals.csv"
-            )
+            if stream_format:
+                return stream_rows(optimizer.iter_signal_timings(), stream_format, download_name=download_name)
+
+            with METRICS.timer('optimize'):
+                optimized_timings = optimizer.compute_signal_timings()
+            with METRICS.timer('serialize', format=fmt):
+                return write_table(optimized_timings, fmt, download_name=download_name)
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
+@app.route('/optimize/batch', methods=['POST'])
+def optimize_batch():
+    """One live polling tick for many junctions: {"observations": [...]} or a bare list"""
+    data = request.get_json(silent=True)
+    observations = data.get('observations') if isinstance(data, dict) else data
+    if not isinstance(observations, list) or not observations:
+        return jsonify({"error": "Expected a non-empty list of observations"}), 400
+
+    try:
+        results = calculate_optimized_timings_batch(observations)
+    except Exception as e:
+        return jsonify({"error": f"Optimization failed: {str(e)}"}), 500
+    return jsonify({"status": "success", "results": results})
+
+instrument(app, METRICS, profile_dir=os.environ.get('LIVE_TRAFFIC_PROFILE_DIR'))
+
 if __name__ == '__main__':
     app.run(debug=True, port=5001)
\ No newline at end of file
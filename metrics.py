@@ -0,0 +1,154 @@
+import cProfile
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import Response, g, request
+
+# Process-wide stage timers, counters and latency histograms, served in the
+# Prometheus text format. Buckets span milliseconds (per-row GA/PSO stages)
+# to minutes (LSTM fits, whole uploads).
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10, 30, 60, 120, 300)
+
+PROFILE_HEADER = 'X-Profile'
+
+def _label_text(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+class Metrics:
+    """Thread-safe counters, gauges and histograms under one metric prefix.
+
+    Collectors registered with add_collector run on every render, for
+    values that live elsewhere (cache sizes, queue depth).
+    """
+
+    def __init__(self, prefix, buckets=LATENCY_BUCKETS):
+        self.prefix = prefix
+        self.buckets = tuple(buckets)
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            self._counters[self._key(name, labels)] += value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[self._key(name, labels)] = value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """Observe the wall time of the block as stage_seconds{stage=...}."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('stage_seconds', time.perf_counter() - start, stage=stage, **labels)
+
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def render(self):
+        for collector in self._collectors:
+            collector(self)
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            gauges = sorted(self._gauges.items())
+            histograms = sorted((k, (list(b), s, c)) for k, (b, s, c) in self._histograms.items())
+
+        lines = []
+        typed = set()
+
+        def declare(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        for (name, labels), value in counters:
+            full = f'{self.prefix}_{name}_total'
+            declare(full, 'counter')
+            lines.append(f'{full}{_label_text(labels)} {value:g}')
+        for (name, labels), value in gauges:
+            full = f'{self.prefix}_{name}'
+            declare(full, 'gauge')
+            lines.append(f'{full}{_label_text(labels)} {value:g}')
+        for (name, labels), (buckets, total, count) in histograms:
+            full = f'{self.prefix}_{name}'
+            declare(full, 'histogram')
+            for bound, bucket_count in zip(self.buckets, buckets):
+                lines.append(f'{full}_bucket{_label_text(labels, [("le", f"{bound:g}")])} {bucket_count}')
+            lines.append(f'{full}_bucket{_label_text(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{full}_sum{_label_text(labels)} {total:g}')
+            lines.append(f'{full}_count{_label_text(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+def instrument(app, metrics, profile_dir=None):
+    """Time every request, serve GET /metrics and honour the profile header.
+
+    With profile_dir set, a request carrying `X-Profile: 1` runs under
+    cProfile; the stats are dumped to a .prof file in that directory and its
+    path is returned in the X-Profile-File response header. Streaming
+    responses are timed and profiled up to the first byte only.
+    """
+
+    @app.before_request
+    def _start_request():
+        g.metrics_start = time.perf_counter()
+        if profile_dir and request.headers.get(PROFILE_HEADER, '').lower() in ('1', 'true', 'yes'):
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already active in this thread
+                return
+            g.profiler = profiler
+
+    @app.after_request
+    def _finish_request(response):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            os.makedirs(profile_dir, exist_ok=True)
+            path = os.path.join(profile_dir, f"{request.endpoint or 'unknown'}-{uuid.uuid4().hex[:12]}.prof")
+            profiler.dump_stats(path)
+            response.headers['X-Profile-File'] = path
+
+        start = g.pop('metrics_start', None)
+        if start is not None and request.endpoint != 'metrics':
+            endpoint = request.endpoint or 'unknown'
+            metrics.observe('request_seconds', time.perf_counter() - start,
+                            endpoint=endpoint, method=request.method)
+            metrics.inc('requests', endpoint=endpoint, method=request.method, status=response.status_code)
+        return response
+
+    @app.route('/metrics', methods=['GET'], endpoint='metrics')
+    def render_metrics():
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
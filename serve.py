@@ -0,0 +1,159 @@
+"""Pre-fork production server for the ahso and live_traffic services.
+
+The master process imports the service with its heavy dependencies (NumPy,
+pandas, pyarrow and, for ahso, scikit-learn and TensorFlow/Keras), runs each
+solver once on a small synthetic week so lazily initialised code paths are
+loaded, then moves the heap out of the garbage collector's reach
+(gc.freeze) and forks the workers, which share all of it copy-on-write.
+Keras models are not fork-safe, so each ahso worker loads the most recently
+used forecasting models itself right after the fork, before it takes a
+request.
+
+Workers are recycled after --max-requests requests (with jitter, so they do
+not all restart together) and serve at most --threads requests at a time.
+The plan cache, job queue and /metrics counters are per worker: poll
+/jobs/<id> through sticky sessions, or run one worker with several threads.
+Keep AHSO_WORKERS at 1 so row-level process pools do not oversubscribe the
+cores the workers already use.
+
+    python serve.py ahso [--workers N] [--threads N] [--bind HOST:PORT] [--max-requests N]
+"""
+import argparse
+import gc
+import importlib
+import logging
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+from gunicorn.app.base import BaseApplication
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, ROOT)
+
+# Default bind address per service, matching their development servers
+SERVICES = {
+    'ahso': '0.0.0.0:5002',
+    'live_traffic': '0.0.0.0:5001'
+}
+
+log = logging.getLogger('gunicorn.error')
+
+def sample_week(signal_count, seed=0):
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(20, 120, size=(168, signal_count))
+    df = pd.DataFrame({f'Signal_{j+1}_Vehicles': counts[:, j] for j in range(signal_count)})
+    df.insert(0, 'Total_Vehicles', counts.sum(axis=1))
+    df.insert(0, 'Hour', np.tile(np.arange(24), 7))
+    df.insert(0, 'Day', np.repeat(['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+                                   'Saturday', 'Sunday'], 24))
+    return df
+
+def preload_ahso(service, args):
+    if args.preload_forecasting:
+        try:
+            service.forecasting_deps()
+        except ImportError as e:
+            log.warning("Forecasting dependencies not preloaded: %s", e)
+    for intersection_type in ('T-Junction', 'Four-Way', 'Diamond'):
+        signal_count = service.get_signal_count(intersection_type)
+        df = sample_week(signal_count)
+        green, red, cycle = service.exact_optimize_signal_timings(df, signal_count)
+        flows, current_queue, current_delay = service.metric_baseline(df, signal_count)
+        service.modeled_metrics(flows, green, cycle, np.zeros(len(df)), np.zeros(len(df)))
+        for objective in service.OBJECTIVES:
+            service.hybrid_optimize_signal_timings(df.iloc[0], signal_count, maxiter=2,
+                                                   rng=np.random.default_rng(0), objective=objective)
+
+def preload_live_traffic(service, args):
+    for intersection_type in ('T-Junction', 'Four-Way'):
+        df = sample_week(3 if intersection_type == 'T-Junction' else 4)
+        service.TrafficSignalOptimizer(intersection_type, df).compute_signal_timings()
+    service.color_to_vehicle_counts(['red', 'green'], [8, 20], [600, 900], ['2.5 km', '800 m'])
+
+def load_recent_models(registry, count):
+    """Load the `count` most recently used forecasting models into registry memory."""
+    if count <= 0 or not os.path.isdir(registry.root):
+        return
+    entries = sorted((e for e in os.scandir(registry.root) if e.is_dir()),
+                     key=lambda e: e.stat().st_mtime, reverse=True)[:count]
+    # Oldest first, so the newest model ends up most recently used
+    for entry in reversed(entries):
+        try:
+            registry.load(entry.name)
+        except Exception as e:
+            log.warning("Could not preload forecasting model %s: %s", entry.name, e)
+
+class PreforkApplication(BaseApplication):
+    def __init__(self, service_name, options, args):
+        self.service_name = service_name
+        self.options = options
+        self.args = args
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # With preload_app this runs once, in the master, before any fork.
+        # The warm-up thread is replaced by the synchronous preload, since
+        # a thread importing TensorFlow must not be running at fork time.
+        os.environ['AHSO_WARMUP'] = '0'
+        service = importlib.import_module(self.service_name)
+        try:
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            pass
+        preload = globals()[f'preload_{self.service_name}']
+        preload(service, self.args)
+        gc.collect()
+        gc.freeze()
+        return service.app
+
+def post_fork_ahso(args):
+    def post_fork(server, worker):
+        service = sys.modules['ahso']
+        if args.preload_forecasting and args.preload_models:
+            load_recent_models(service.MODEL_REGISTRY, args.preload_models)
+    return post_fork
+
+def gunicorn_options(args):
+    options = {
+        'bind': args.bind or SERVICES[args.service],
+        'workers': args.workers or os.cpu_count(),
+        'threads': args.threads,
+        'worker_class': 'gthread' if args.threads > 1 else 'sync',
+        'preload_app': True,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests_jitter,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'accesslog': args.access_log
+    }
+    if args.service == 'ahso':
+        options['post_fork'] = post_fork_ahso(args)
+    return options
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('service', choices=sorted(SERVICES))
+    parser.add_argument('--bind', help='HOST:PORT, defaults to the development server port')
+    parser.add_argument('--workers', type=int, default=0, help='worker processes, 0 for one per core')
+    parser.add_argument('--threads', type=int, default=4, help='concurrent requests per worker')
+    parser.add_argument('--max-requests', type=int, default=1000, help='recycle a worker after this many requests')
+    parser.add_argument('--max-requests-jitter', type=int, default=100)
+    parser.add_argument('--timeout', type=int, default=600, help='seconds before a silent worker is restarted')
+    parser.add_argument('--graceful-timeout', type=int, default=60)
+    parser.add_argument('--preload-models', type=int, default=4,
+                        help='forecasting models each ahso worker loads after the fork')
+    parser.add_argument('--no-preload-forecasting', dest='preload_forecasting', action='store_false',
+                        help='skip importing TensorFlow/Keras in the master')
+    parser.add_argument('--access-log', default=None, help="access log file, '-' for stdout")
+    args = parser.parse_args()
+    PreforkApplication(args.service, gunicorn_options(args), args).run()
+
+if __name__ == '__main__':
+    main()
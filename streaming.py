@@ -0,0 +1,50 @@
+import csv
+import io
+import json
+import math
+
+from flask import Response, stream_with_context
+
+# Row-at-a-time response formats
+STREAM_FORMATS = ('ndjson', 'csv')
+
+def _json_value(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+def _json_default(value):
+    # NumPy integers/bools are not JSON serialisable on their own
+    return value.item()
+
+def ndjson_lines(rows):
+    try:
+        for row in rows:
+            yield json.dumps({k: _json_value(v) for k, v in row.items()}, default=_json_default) + "\n"
+    except Exception as e:
+        # Headers are already sent, so report the failure in-band
+        yield json.dumps({"error": str(e)}) + "\n"
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(buffer, fieldnames=list(row.keys()), extrasaction='ignore')
+            writer.writeheader()
+        writer.writerow({k: _json_value(v) for k, v in row.items()})
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+def stream_rows(rows, stream_format, download_name):
+    """Stream an iterable of row dicts as NDJSON or chunked CSV."""
+    if stream_format == 'ndjson':
+        body, mimetype, extension = ndjson_lines(rows), 'application/x-ndjson', 'ndjson'
+    else:
+        body, mimetype, extension = csv_chunks(rows), 'text/csv', 'csv'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={download_name}.{extension}"}
+    )
@@ -0,0 +1,119 @@
+import io
+import json
+
+from flask import Response
+
+from ingest import CHUNK_ROWS, arrow_chunks, concat_compact, read_csv_chunks
+
+# Tabular request/response formats, parsed from and serialised to in-memory
+# buffers. Arrow IPC and Parquet need the optional pyarrow package.
+RESULT_FORMATS = ('csv', 'json', 'parquet', 'arrow')
+
+ARROW_MIMETYPES = ('application/vnd.apache.arrow.file', 'application/vnd.apache.arrow.stream')
+PARQUET_MIMETYPES = ('application/vnd.apache.parquet', 'application/x-parquet')
+
+ACCEPT_FORMATS = dict(
+    [('text/csv', 'csv'), ('application/json', 'json')]
+    + [(m, 'arrow') for m in ARROW_MIMETYPES] + [(m, 'parquet') for m in PARQUET_MIMETYPES]
+)
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.ipc
+    except ImportError:
+        raise ValueError("Arrow and Parquet formats require the pyarrow package") from None
+    return pyarrow
+
+def _arrow_batches(data):
+    pa = _pyarrow()
+    if data[:6] == b'ARROW1':
+        reader = pa.ipc.open_file(pa.BufferReader(data))
+        return (reader.get_batch(i) for i in range(reader.num_record_batches))
+    return iter(pa.ipc.open_stream(pa.BufferReader(data)))
+
+def _parquet_batches(data):
+    pa = _pyarrow()
+    import pyarrow.parquet
+    return pyarrow.parquet.ParquetFile(pa.BufferReader(data)).iter_batches(batch_size=CHUNK_ROWS)
+
+def request_fields(request):
+    """Form fields for multipart uploads, the body itself for JSON requests,
+    or the query string for raw Arrow/Parquet bodies."""
+    if request.is_json:
+        return request.get_json(silent=True) or {}
+    if request.mimetype in ARROW_MIMETYPES + PARQUET_MIMETYPES:
+        return request.args
+    return request.form
+
+def read_upload(request, combine=concat_compact):
+    """Parse the uploaded table straight from the request, without touching disk.
+
+    Accepts a JSON body with a `csv_data` string, a multipart `file` (CSV,
+    Parquet or Arrow IPC by extension), or a raw Arrow/Parquet request body.
+    Tables are read in chunks with compact dtypes (see ingest) and handed
+    to `combine`, which concatenates them by default; ingest.hourly and
+    ingest.hourly_means fold them on the way instead.
+    """
+    if request.is_json:
+        body = request.get_json(silent=True) or {}
+        if not body.get('csv_data'):
+            raise ValueError("No csv_data provided")
+        return combine(read_csv_chunks(io.StringIO(body['csv_data'])))
+
+    mimetype = request.mimetype
+    if mimetype in ARROW_MIMETYPES:
+        return combine(arrow_chunks(_arrow_batches(request.get_data())))
+    if mimetype in PARQUET_MIMETYPES:
+        return combine(arrow_chunks(_parquet_batches(request.get_data())))
+
+    if 'file' not in request.files:
+        raise ValueError("No file uploaded")
+    file = request.files['file']
+    name = (file.filename or '').lower()
+    if name.endswith('.parquet'):
+        return combine(arrow_chunks(_parquet_batches(file.read())))
+    if name.endswith(('.arrow', '.feather', '.ipc', '.arrows')):
+        return combine(arrow_chunks(_arrow_batches(file.read())))
+    return combine(read_csv_chunks(file.stream))
+
+def _accepted_format(request):
+    # Highest-quality Accept entry naming a result format; wildcards don't count
+    for mimetype, _ in request.accept_mimetypes:
+        if mimetype in ACCEPT_FORMATS:
+            return ACCEPT_FORMATS[mimetype]
+    return None
+
+def result_format(request, fields):
+    """Requested result format: the `format` field, else the Accept header,
+    else JSON for JSON requests and CSV otherwise."""
+    fmt = fields.get('format') or _accepted_format(request) or ('json' if request.is_json else 'csv')
+    if fmt not in RESULT_FORMATS:
+        raise ValueError(f"format must be one of {', '.join(RESULT_FORMATS)}")
+    return fmt
+
+def write_table(df, fmt, download_name):
+    """Serialise a result DataFrame from an in-memory buffer."""
+    if fmt == 'json':
+        body = json.dumps({"status": "success", "data": json.loads(df.to_json(orient='records'))})
+        return Response(body, mimetype='application/json')
+
+    buffer = io.BytesIO()
+    if fmt == 'parquet':
+        _pyarrow()
+        df.to_parquet(buffer, index=False)
+        mimetype, extension = PARQUET_MIMETYPES[0], 'parquet'
+    elif fmt == 'arrow':
+        pa = _pyarrow()
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.ipc.new_file(buffer, table.schema) as writer:
+            writer.write_table(table)
+        mimetype, extension = ARROW_MIMETYPES[0], 'arrow'
+    else:
+        df.to_csv(buffer, index=False)
+        mimetype, extension = 'text/csv', 'csv'
+    return Response(
+        buffer.getvalue(),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f"attachment; filename={download_name}.{extension}"}
+    )
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The services are flat top-level modules; import them from the repo root
+# without the on-disk result store or the forecasting warm-up thread
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['AHSO_RESULT_STORE'] = ''
+os.environ['AHSO_WARMUP'] = '0'
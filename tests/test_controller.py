@@ -0,0 +1,12 @@
+import controller
+
+def observation(junction_id):
+    return {'junction_id': junction_id, 'color': 'red', 'green_times': [30, 30, 30],
+            'red_times': [90, 90, 90], 'intersection_type': 'T-Junction', 'current_hour': 9, 'timestamp': 0}
+
+def test_unhashable_junction_ids_become_error_lines():
+    results = controller.AdaptiveController().update(
+        [observation(['a']), observation({'id': 1}), observation(True), observation('a'), observation(7)])
+    assert [r.get('error') for r in results[:3]] == ["junction_id must be a string or an integer"] * 3
+    assert [r['junction_id'] for r in results[3:]] == ['a', 7]
+    assert all('error' not in r for r in results[3:])
@@ -0,0 +1,35 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import corridor
+
+def random_tables(Tables, size, cycle, seed):
+    rng = np.random.default_rng(seed)
+    green = np.maximum(1, np.round(rng.uniform(0.3, 0.7, size) * cycle)).astype(int)
+    travel_out = rng.uniform(10, 90, size - 1)
+    return Tables(cycle, green, travel_out, travel_out * rng.uniform(0.8, 1.2, size - 1))
+
+def brute_force(tables):
+    offsets = np.array([(0,) + rest for rest in itertools.product(range(tables.cycle), repeat=tables.size - 1)])
+    return tables.score(offsets).min()
+
+def test_max_circular_run_wraps_around():
+    mask = np.array([[1, 1, 0, 1, 0, 1, 1, 1], [1] * 8, [0] * 8, [0, 1, 1, 1, 0, 0, 0, 0]], dtype=bool)
+    assert corridor.max_circular_run(mask).tolist() == [5, 8, 0, 3]
+
+@pytest.mark.parametrize('Tables', [corridor.BandwidthTables, corridor.DelayTables])
+@pytest.mark.parametrize('size, cycle', [(2, 60), (3, 40), (4, 20)])
+def test_exact_offsets_match_brute_force(Tables, size, cycle):
+    for seed in range(5):
+        tables = random_tables(Tables, size, cycle, seed)
+        offsets, _ = tables.exact_offsets(limit=cycle ** size)
+        assert tables.score(offsets[None, :])[0] == pytest.approx(brute_force(tables))
+
+@pytest.mark.parametrize('size, cycle', [(3, 50), (4, 24)])
+def test_search_matches_brute_force_on_small_corridors(size, cycle):
+    for seed in range(10):
+        tables = random_tables(corridor.BandwidthTables, size, cycle, seed)
+        offsets, _ = corridor.optimize_offsets(tables, np.random.default_rng(seed), exact_limit=0)
+        assert tables.score(offsets[None, :])[0] == brute_force(tables)
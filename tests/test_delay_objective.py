@@ -0,0 +1,47 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+import ahso
+
+def test_overrunning_plans_score_as_scaled_to_fit():
+    flows = np.array([[300.0, 200.0, 100.0, 50.0]])
+    cycle = np.array([120])
+    overrun = np.array([[90, 90, 90, 90]])
+    fitted = np.array([[26, 26, 26, 26]])
+    zeros = np.zeros(1)
+    assert ahso.modeled_metrics(flows, overrun, cycle, zeros, zeros) == \
+        ahso.modeled_metrics(flows, fitted, cycle, zeros, zeros)
+
+def test_delay_plans_are_not_shared_between_volumes():
+    # Same shares, same 120 s cycle bucket, double the traffic
+    df = pd.DataFrame({'Signal_1_Vehicles': [60, 120], 'Signal_2_Vehicles': [120, 240],
+                       'Signal_3_Vehicles': [180, 360], 'Signal_4_Vehicles': [240, 480]})
+    df.insert(0, 'Total_Vehicles', df.sum(axis=1))
+    options = dict(seed=0, workers=1, maxiter=10, objective='delay')
+    uncached = list(ahso.iter_plans(df, 'Four-Way', cache=None, **options))
+    cached = list(ahso.iter_plans(df, 'Four-Way', cache=ahso.SignalPlanCache(), **options))
+    assert [plan[0] for plan in cached] == [plan[0] for plan in uncached]
+
+def test_fairness_plans_are_still_shared_between_volumes():
+    df = pd.DataFrame({'Signal_1_Vehicles': [60, 120], 'Signal_2_Vehicles': [120, 240]})
+    df.insert(0, 'Total_Vehicles', [600, 1200])
+    report = {}
+    list(ahso.iter_plans(df, 'T-Junction', cache=ahso.SignalPlanCache(), seed=0, maxiter=5, report=report))
+    assert report['rows_searched'] == 1
+
+def test_blank_counts_do_not_break_the_plan_cache():
+    cache = ahso.SignalPlanCache()
+    flows = [100.0, np.nan, 50.0]
+    assert cache.key('T-Junction', 90, [0.5, np.nan, 0.25], flows=flows) == \
+        cache.key('T-Junction', 90, [0.5, np.nan, 0.25], flows=flows)
+
+    csv = 'Day,Hour,Total_Vehicles,Signal_1_Vehicles,Signal_2_Vehicles,Signal_3_Vehicles\n' \
+          'Monday,0,300,100,150,\nMonday,1,320,100,120,100\n'
+    client = ahso.app.test_client()
+    for objective in ahso.OBJECTIVES:
+        response = client.post('/optimize', data={
+            'file': (io.BytesIO(csv.encode()), 'week.csv'), 'intersection_type': 'T-Junction',
+            'maxiter': '5', 'objective': objective})
+        assert response.status_code == 200, response.get_json()
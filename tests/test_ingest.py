@@ -0,0 +1,69 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ingest
+
+def five_minute_csv(intersections=('A', 'B', 'C'), hours=6, seed=0):
+    """Interleaved 5-minute readings, with Avg_Queue_Length ahead of the counts."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for hour in range(hours):
+        for minute in range(0, 60, 5):
+            for intersection in intersections:
+                counts = rng.integers(0, 30, size=3)
+                rows.append({'Intersection_ID': intersection, 'Day': 'Tuesday', 'Hour': hour,
+                             'Avg_Queue_Length': round(rng.uniform(0, 10), 2),
+                             'Signal_1_Vehicles': counts[0], 'Signal_2_Vehicles': counts[1],
+                             'Signal_3_Vehicles': counts[2], 'Total_Vehicles': counts.sum()})
+    df = pd.DataFrame(rows)
+    return df, df.to_csv(index=False)
+
+def reference_hourly(df):
+    grouped = df.groupby(['Intersection_ID', 'Day', 'Hour'], sort=False)
+    counts = ['Signal_1_Vehicles', 'Signal_2_Vehicles', 'Signal_3_Vehicles', 'Total_Vehicles']
+    expected = grouped[counts].sum().join(grouped[['Avg_Queue_Length']].mean()).reset_index()
+    order = np.argsort(pd.factorize(expected['Intersection_ID'])[0], kind='stable')
+    return expected.iloc[order].reset_index(drop=True)
+
+@pytest.mark.parametrize('chunksize', [7, 36, 997, ingest.CHUNK_ROWS])
+def test_five_minute_rows_fold_into_hours_across_chunks(chunksize):
+    df, csv = five_minute_csv()
+    folded = ingest.read_hourly_csv(io.StringIO(csv), chunksize=chunksize)
+    expected = reference_hourly(df)
+
+    assert len(folded) == 3 * 6
+    assert folded['Intersection_ID'].tolist() == expected['Intersection_ID'].tolist()
+    assert folded['Hour'].tolist() == expected['Hour'].tolist()
+    for column in ['Signal_1_Vehicles', 'Signal_2_Vehicles', 'Signal_3_Vehicles', 'Total_Vehicles']:
+        assert folded[column].tolist() == expected[column].tolist()
+    assert np.allclose(folded['Avg_Queue_Length'], expected['Avg_Queue_Length'], atol=0.005)
+
+def test_hourly_keeps_the_column_order():
+    df, csv = five_minute_csv()
+    folded = ingest.read_hourly_csv(io.StringIO(csv), chunksize=50)
+    assert folded.columns.tolist() == df.columns.tolist()
+
+def test_hourly_rows_pass_through_unchanged():
+    df, _ = five_minute_csv(intersections=('A',))
+    hourly = reference_hourly(df)
+    folded = ingest.read_hourly_csv(io.StringIO(hourly.to_csv(index=False)), chunksize=4)
+    assert folded['Total_Vehicles'].tolist() == hourly['Total_Vehicles'].tolist()
+    assert folded['Avg_Queue_Length'].tolist() == hourly['Avg_Queue_Length'].round(2).tolist()
+    assert folded['Day'].dtype == 'category'
+    assert folded['Hour'].dtype == np.int8
+
+def test_hourly_means_match_a_groupby_whatever_the_chunking():
+    df, csv = five_minute_csv()
+    df.loc[::7, 'Signal_2_Vehicles'] = np.nan
+    csv = df.to_csv(index=False)
+    keys = ['Intersection_ID', 'Day', 'Hour']
+    counts = ['Signal_1_Vehicles', 'Signal_2_Vehicles', 'Signal_3_Vehicles', 'Total_Vehicles']
+    expected = df.groupby(keys)[counts].mean()
+    for chunksize in (11, 1000):
+        means = ingest.hourly_means(ingest.read_csv_chunks(io.StringIO(csv), chunksize))
+        assert means.columns.tolist() == keys + counts
+        pd.testing.assert_frame_equal(means.set_index(keys).sort_index(), expected, check_dtype=False,
+                                      check_index_type=False)
@@ -0,0 +1,20 @@
+import itertools
+
+import pytest
+
+import live_traffic
+
+CASES = itertools.product(['red', 'Yellow', 'green'], [3, 9, 19, 23], [0, 450, 2400], ['10 km', '800 m', 'n/a'])
+
+@pytest.mark.parametrize('color, hour, travel_time, distance', list(CASES))
+def test_single_junction_matches_the_batch_path(color, hour, travel_time, distance):
+    green, red = [40, 35.5, 30, 22], [100, 110, 120.5, 110]
+    single = live_traffic.calculate_optimized_timings(color, green, red, 'Four-Way', hour, travel_time, distance)
+    batch, = live_traffic.calculate_optimized_timings_batch([{
+        'color': color, 'green_times': green, 'red_times': red, 'intersection_type': 'Four-Way',
+        'current_hour': hour, 'current_travel_time': travel_time, 'current_distance': distance}])
+    assert single == batch
+
+def test_single_junction_errors_are_value_errors():
+    with pytest.raises(ValueError, match='exactly 3'):
+        live_traffic.calculate_optimized_timings('red', [30, 30], [60, 60], 'T-Junction', 9, 600, '5 km')
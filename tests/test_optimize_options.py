@@ -0,0 +1,13 @@
+import pytest
+
+import ahso
+
+@pytest.mark.parametrize('field, value', [('seed', '-3'), ('swarmsize', '0'), ('maxiter', '5000'),
+                                          ('workers', '-1'), ('tol', 'nan'), ('time_budget', '0')])
+def test_out_of_range_options_are_rejected(field, value):
+    with pytest.raises(ValueError, match=field):
+        ahso.optimize_options_from_form({field: value})
+
+def test_valid_options_are_parsed():
+    options = ahso.optimize_options_from_form({'seed': '0', 'swarmsize': '20', 'workers': '0'})
+    assert options == {'seed': 0, 'swarmsize': 20, 'workers': 0}
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import ahso
+
+SEARCH = dict(intersection_type='Four-Way', seed=0, cache=None, workers=1, maxiter=5, patience=0)
+
+def day_frame(seed=0):
+    rng = np.random.default_rng(seed)
+    counts = rng.integers(20, 300, size=(24, 4))
+    df = pd.DataFrame(counts, columns=[f'Signal_{j+1}_Vehicles' for j in range(4)])
+    df.insert(0, 'Total_Vehicles', counts.sum(axis=1))
+    df.insert(0, 'Hour', np.arange(24))
+    df.insert(0, 'Day', 'Monday')
+    return df
+
+def greens(df):
+    return df[[f'Signal_{j+1}_Green' for j in range(4)]].to_numpy()
+
+@pytest.fixture
+def store(tmp_path):
+    return ahso.ResultStore(str(tmp_path / 'results.sqlite3'))
+
+def test_plans_round_trip_per_settings(store):
+    keys = [('A', 'Monday', 0, 11), ('A', 'Monday', 1, 12)]
+    store.put_plans(keys, 's1', [([30, 40], [56, 46], 90), ([35, 35], [51, 51], 90)])
+    assert store.get_plans(keys + [('A', 'Monday', 2, 13)], 's1') == [
+        ([30, 40], [56, 46], 90), ([35, 35], [51, 51], 90), None]
+    assert store.get_plans(keys, 's2') == [None, None]
+
+def test_row_keys_change_only_with_the_row_inputs():
+    df = day_frame()
+    changed = df.copy()
+    changed.loc[5, 'Signal_2_Vehicles'] += 1
+    before = ahso.ResultStore.row_keys(df, 'A', 4)
+    after = ahso.ResultStore.row_keys(changed, 'A', 4)
+    assert [i for i, (a, b) in enumerate(zip(before, after)) if a != b] == [5]
+
+def test_reupload_only_searches_changed_rows(store):
+    df = day_frame()
+    first_report = {}
+    first = ahso.optimize_dataset(df, store=store, intersection_id='A', report=first_report, **SEARCH)
+    assert first_report['rows_searched'] == len(df)
+
+    changed = df.copy()
+    rows = [3, 10, 17]
+    changed.loc[rows, 'Signal_1_Vehicles'] += 50
+    changed['Total_Vehicles'] = changed[[f'Signal_{j+1}_Vehicles' for j in range(4)]].sum(axis=1)
+    report = {}
+    second = ahso.optimize_dataset(changed, store=store, intersection_id='A', report=report, **SEARCH)
+    assert report['rows_searched'] == len(rows)
+    assert report['rows_from_store'] == len(df) - len(rows)
+    unchanged = np.setdiff1d(np.arange(len(df)), rows)
+    assert (greens(second)[unchanged] == greens(first)[unchanged]).all()
+
+def test_identical_upload_is_returned_whole(store):
+    df = day_frame()
+    first = ahso.optimize_dataset(df, store=store, intersection_id='A', **SEARCH)
+    report = {}
+    again = ahso.optimize_dataset(df, store=store, intersection_id='A', report=report, **SEARCH)
+    assert 'rows_searched' not in report
+    assert report['rows_from_store'] == len(df)
+    pd.testing.assert_frame_equal(again, first)
+
+def test_other_intersection_or_settings_miss(store):
+    df = day_frame()
+    ahso.optimize_dataset(df, store=store, intersection_id='A', **SEARCH)
+    for options in ({'intersection_id': 'B'}, {'intersection_id': 'A', 'inertia': 0.7}):
+        report = {}
+        ahso.optimize_dataset(df, store=store, report=report, **dict(SEARCH, **options))
+        assert report['rows_searched'] == len(df)
+
+def test_budgeted_runs_do_not_write(store):
+    df = day_frame()
+    ahso.optimize_dataset(df, store=store, intersection_id='A', time_budget=30, **SEARCH)
+    report = {}
+    ahso.optimize_dataset(df, store=store, intersection_id='A', report=report, **SEARCH)
+    assert report['rows_searched'] == len(df)
+
+def test_only_the_newest_files_are_kept(tmp_path):
+    store = ahso.ResultStore(str(tmp_path / 'results.sqlite3'), max_files=2)
+    for name in ('a', 'b', 'c'):
+        store.put_file(name, pd.DataFrame({'x': [name]}))
+    assert store.get_file('a') is None
+    assert store.get_file('c')['x'].tolist() == ['c']
@@ -0,0 +1,44 @@
+import io
+
+import pandas as pd
+import pytest
+
+import ahso
+
+pa = pytest.importorskip('pyarrow')
+
+WEEK = pd.DataFrame({'Day': ['Monday', 'Monday'], 'Hour': [0, 1], 'Total_Vehicles': [300, 320],
+                     'Signal_1_Vehicles': [100, 100], 'Signal_2_Vehicles': [150, 120],
+                     'Signal_3_Vehicles': [50, 100]})
+
+def arrow_body(df):
+    buffer = io.BytesIO()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.ipc.new_file(buffer, table.schema) as writer:
+        writer.write_table(table)
+    return buffer.getvalue()
+
+def read_arrow(data):
+    return pa.ipc.open_file(pa.BufferReader(data)).read_all().to_pandas()
+
+def test_raw_arrow_bodies_take_options_from_the_query_string():
+    client = ahso.app.test_client()
+    response = client.post('/optimize?solver=exact&intersection_type=T-Junction&format=arrow',
+                           data=arrow_body(WEEK), content_type='application/vnd.apache.arrow.file')
+    assert response.status_code == 200, response.get_data()
+    assert response.mimetype == 'application/vnd.apache.arrow.file'
+    exact = ahso.optimize_dataset(WEEK, 'T-Junction', solver='exact')
+    result = read_arrow(response.data)
+    assert list(result.columns) == list(exact.columns)
+    pd.testing.assert_frame_equal(result.drop(columns='Day'), exact.drop(columns='Day'), check_dtype=False)
+
+def test_accept_header_picks_the_result_format():
+    client = ahso.app.test_client()
+    response = client.post('/optimize?solver=exact', data=arrow_body(WEEK),
+                           content_type='application/vnd.apache.arrow.file',
+                           headers={'Accept': 'text/csv;q=0.5, application/json'})
+    assert response.mimetype == 'application/json'
+    response = client.post('/optimize?solver=exact&format=csv', data=arrow_body(WEEK),
+                           content_type='application/vnd.apache.arrow.file',
+                           headers={'Accept': 'application/json'})
+    assert response.mimetype == 'text/csv'